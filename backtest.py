@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+import arrow
+import csv
+import json
+import numpy as np
+import sys
+import yaml
+from pkg.arg_parser.backtest import create_argparse
+from pkg.data import BULK_CHUNK_SIZE
+from pkg.data.cache import create_sales_loader
+from pkg.data.category import create_category_sales_loader
+from pkg.forecast.backtest import create_backtest_report, get_backtest_values, get_rolling_requests, \
+    get_series_metrics
+from pkg.utils.console import panic
+from pkg.utils.days import to_day_ordinal
+from pkg.utils.files import read_file
+from pkg.utils.pool import map_ordered, report_progress
+from pkg.utils.series import format_percent
+from pkg.utils.shard import is_in_shard
+from progress.bar import ChargingBar
+
+METRICS = ['count', 'accuracy_errors', 'standard_deviation', 'mape', 'wape', 'rmse', 'bias']
+LOAD_SALES = None
+LOAD_CATEGORY_SALES = None
+
+
+def init_worker(config, algorithms, cache_dir, refresh_cache):
+    global LOAD_CATEGORY_SALES, LOAD_SALES
+    LOAD_SALES = create_sales_loader(config['mysql'], cache_dir, refresh_cache, series=True)
+    LOAD_CATEGORY_SALES = create_category_sales_loader(config['mysql']) if 'category' in algorithms else None
+
+
+def backtest_barcodes(store_id, barcodes, algorithms, origins, horizons, series_metrics):
+    # Every series is loaded once, its real sales and forecasts never leave memory
+    sales = LOAD_SALES(store_id, barcodes)
+    category_sales = None
+    if LOAD_CATEGORY_SALES:
+        categories = LOAD_CATEGORY_SALES(store_id, barcodes)
+        category_sales = [categories[(store_id, barcode)] for barcode in barcodes]
+    real, forecasts = get_backtest_values(algorithms,
+                                          [sales[(store_id, barcode)] for barcode in barcodes],
+                                          origins,
+                                          horizons,
+                                          category_sales)
+    for barcode in barcodes:
+        report_progress(store_id, barcode, len(origins))
+    return store_id, barcodes, real, forecasts, get_series_metrics(real, forecasts) if series_metrics else None
+
+
+def print_report(report):
+    for algorithm, metrics in report.items():
+        print(f'{algorithm}:')
+        groups = [('all days', metrics['total'])] + [(f'{days} days', m) for days, m in metrics['days'].items()]
+        for name, m in groups:
+            if m is None:
+                continue
+            print(f'... {name}: accuracy errors {m["accuracy_errors"]}%, standard deviation {m["standard_deviation"]}, '
+                  f'MAPE {format_percent(m["mape"])}, WAPE {format_percent(m["wape"])}, RMSE {m["rmse"]}, '
+                  f'bias {m["bias"]}, forecasts {m["count"]}')
+        print()
+
+
+if __name__ == '__main__':
+    if sys.version_info < (3, 8):
+        panic('We need minimum Python version 3.8 to run. Current version: %s.%s.%s' % sys.version_info[:3])
+
+    args = create_argparse()
+    if args.roll < 1 or args.step < 1:
+        panic('--roll and --step must be positive')
+
+    config = yaml.safe_load(read_file(args.config))
+    print(f'Config loaded from {args.config}')
+
+    algorithms = list(dict.fromkeys(args.algorithms))
+    requests = get_rolling_requests([(to_day_ordinal(arrow.get(period['date'], 'DD.MM.YYYY').date()), period['days'])
+                                     for period in config['periods']], args.roll, args.step)
+    origins = np.array([origin for origin, _ in requests], dtype=np.int64)
+    horizons = np.array([days for _, days in requests], dtype=np.int64)
+    store_barcodes = [(store_id, [barcode for barcode in config['barcodes']
+                                  if is_in_shard(args.shard, store_id, barcode)])
+                      for store_id in config['stores']]
+
+    print(f'Backtesting {", ".join(algorithms)} on {len(requests)} origins of every series...')
+    bar = ChargingBar('Waiting...', max=sum(len(codes) for _, codes in store_barcodes) * len(requests))
+    bar.start()
+
+    def on_progress(store_id, barcode, count):
+        bar.message = f'[Store: {store_id}] {str(barcode).ljust(13, " ")}'
+        bar.next(count)
+
+    series_file = None
+    csv_writer = None
+    if args.series_output:
+        series_file = open(args.series_output, 'w', newline='')
+        csv_writer = csv.writer(series_file, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+    add, report = create_backtest_report(algorithms, horizons)
+    tasks = ((store_id, codes[i:i + BULK_CHUNK_SIZE], algorithms, origins, horizons, csv_writer is not None)
+             for store_id, codes in store_barcodes
+             for i in range(0, len(codes), BULK_CHUNK_SIZE))
+    results = map_ordered(backtest_barcodes,
+                          tasks,
+                          args.workers,
+                          on_progress,
+                          initializer=init_worker,
+                          initargs=(config, algorithms, args.cache_dir, args.refresh_cache))
+    for store_id, barcodes, real, forecasts, series_metrics in results:
+        add(real, forecasts)
+        if csv_writer:
+            csv_writer.writerows([store_id, barcode, algorithm] + [metrics[algorithm][name] for name in METRICS]
+                                 for barcode, metrics in zip(barcodes, series_metrics) for algorithm in algorithms)
+
+    bar.finish()
+    if series_file:
+        series_file.close()
+        print(f'Metrics of every series were written to {args.series_output}')
+    print()
+
+    result = report()
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'roll': args.roll, 'step': args.step, 'algorithms': result}, f, indent=2)
+        print(f'Report was written to {args.output}')
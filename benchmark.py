@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import csv
+import json
+import numpy as np
+import os
+import pandas as pd
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import medivh
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime
+from pkg.arg_parser.benchmark import create_argparse
+from pkg.arg_parser.medivh import create_argparse as create_medivh_argparse
+from pkg.data.synthetic import generate_daily_sales, get_synthetic_barcodes, write_sales_cache
+from pkg.forecast import get_barcode_forecast, get_mean_forecast
+from pkg.utils.bench import run_measured, summarize_latencies, time_calls, timer
+from pkg.utils.console import panic
+from pkg.utils.days import to_datetime64, to_day_ordinal
+from pkg.utils.sales import create_sales_series
+
+PERIOD_HORIZONS = [3, 5, 7, 14]
+# Forecast origins are spread over this many days before the end of history
+PERIOD_SPREAD_DAYS = 90
+
+
+def get_git_commit():
+    # noinspection PyBroadException
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True,
+                              text=True,
+                              check=True).stdout.strip()
+    except:
+        return None
+
+
+def create_periods(end_day, count):
+    origins = np.linspace(end_day - PERIOD_SPREAD_DAYS, end_day - 1, count).astype(int)
+    horizons = [PERIOD_HORIZONS[i % len(PERIOD_HORIZONS)] for i in range(count)]
+    return [{'date': to_datetime64(origin).item().strftime('%d.%m.%Y'), 'days': days}
+            for origin, days in zip(origins, horizons)]
+
+
+def get_period_days(period):
+    origin = datetime.strptime(period['date'], '%d.%m.%Y').date()
+    return origin, to_datetime64(to_day_ordinal(origin) + period['days']).item()
+
+
+def write_short_input(path, keys, periods):
+    with open(path, 'w', newline='') as f:
+        csv_writer = csv.writer(f)
+        for store_id, barcode in keys:
+            for period in periods:
+                origin, _ = get_period_days(period)
+                csv_writer.writerow([store_id, barcode, origin.isoformat(), period['days']])
+
+
+def try_forecast(fn, *args):
+    # The default algorithm raises for series it does not apply to, which is timed as well
+    # noinspection PyBroadException
+    try:
+        fn(*args)
+    except:
+        pass
+
+
+def benchmark_functions(dfs, periods, sample):
+    keys = list(dfs)[:sample]
+    sales = {key: create_sales_series(dfs[key]) for key in keys}
+    calls = [(sales[key],) + get_period_days(period) for key in keys for period in periods]
+    functions = {
+        'get_barcode_forecast': lambda *a: try_forecast(get_barcode_forecast, *a),
+        'get_mean_forecast': get_mean_forecast,
+        'do_forecast': lambda *a: medivh.do_forecast('default', *a),
+    }
+    results = {}
+    for name, fn in functions.items():
+        # Every case runs in its own process, see run_measured
+        latencies, peak_rss_mb = run_measured(lambda: time_calls(fn, calls))
+        results[name] = summarize_latencies(latencies, len(calls), peak_rss_mb)
+    return results
+
+
+def benchmark_end_to_end(run, forecasts, repeat):
+    def run_all():
+        latencies = []
+        for _ in range(repeat):
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull), redirect_stderr(devnull), \
+                    timer(latencies):
+                run()
+        return latencies
+
+    latencies, peak_rss_mb = run_measured(run_all)
+    return summarize_latencies(latencies, forecasts * repeat, peak_rss_mb)
+
+
+def print_results(results):
+    print(f'{"benchmark":<22}{"forecasts/s":>14}{"p50 ms":>12}{"p99 ms":>12}{"peak RSS MB":>14}')
+    for name, result in results.items():
+        print(f'{name:<22}{result["forecasts_per_sec"] or 0:>14.1f}{result["p50_ms"] or 0:>12.3f}'
+              f'{result["p99_ms"] or 0:>12.3f}{result["peak_rss_mb"]:>14.1f}')
+
+
+if __name__ == '__main__':
+    if sys.version_info < (3, 8):
+        panic('We need minimum Python version 3.8 to run. Current version: %s.%s.%s' % sys.version_info[:3])
+
+    args = create_argparse()
+    end_day = to_day_ordinal(datetime.strptime(args.end, '%Y-%m-%d').date())
+    stores = list(range(1, args.stores + 1))
+    barcodes = get_synthetic_barcodes(args.barcodes)
+    periods = create_periods(end_day, args.periods)
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='medivh-benchmark-')
+    os.makedirs(data_dir, exist_ok=True)
+    cache_dir = os.path.join(data_dir, 'cache')
+    try:
+        print(f'Generating {len(stores)} stores x {len(barcodes)} barcodes x {args.years} years of sales...')
+        start = time.perf_counter()
+        dfs = generate_daily_sales(stores, barcodes, end_day, args.years, args.seed)
+        os.makedirs(cache_dir, exist_ok=True)
+        write_sales_cache(cache_dir, dfs, end_day)
+        in_file = os.path.join(data_dir, 'input.csv')
+        write_short_input(in_file, list(dfs), periods)
+        print(f'Generated {sum(len(df) for df in dfs.values())} daily sales in {time.perf_counter() - start:.1f}s')
+
+        print('Timing forecast functions...')
+        results = benchmark_functions(dfs, periods, args.sample)
+
+        medivh.CONFIG = {'mysql': {}, 'stores': stores, 'barcodes': barcodes, 'periods': periods}
+        out_file = os.path.join(data_dir, 'result.csv')
+        # End to end runs get the options medivh.py makes of a command line with these arguments
+        run_options = medivh.create_run_options(create_medivh_argparse(
+            ['-c', os.devnull, '-o', out_file, '-a', args.algorithm, '-w', str(args.workers), '--cache-dir', cache_dir,
+             '--series-cache', '0'] + (['--kernel'] if args.kernel else [])))
+        forecasts = len(dfs) * len(periods)
+
+        print('Timing end to end runs...')
+        results['process_default'] = benchmark_end_to_end(
+            lambda: medivh.process_default(out_file, args.algorithm, run_options),
+            forecasts,
+            args.repeat)
+        results['process_short'] = benchmark_end_to_end(
+            lambda: medivh.process_short(out_file, in_file, args.algorithm, run_options),
+            forecasts,
+            args.repeat)
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    print_results(results)
+    if args.output:
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'commit': get_git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'params': {key: value for key, value in vars(args).items() if key not in ('output', 'data_dir')},
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nResults were written to {args.output}')
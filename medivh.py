@@ -1,162 +1,356 @@
 #!/usr/bin/env python3
 
 import arrow
+import cProfile
 import csv
+import itertools
+import json
+import math
+import os
+import time
 import yaml
 import sys
 from pkg.arg_parser.medivh import create_argparse
-from pkg.data import get_barcode_daily_sales, create_engine
-from pkg.forecast import get_barcode_forecast, get_mean_forecast
-from pkg.utils.console import panic, write_stdout, write_stderr
-from pkg.utils.files import read_file
+from pkg.data import BULK_CHUNK_SIZE
+from pkg.data.cache import create_sales_loader
+from pkg.data.category import create_category_sales_loader
+from pkg.data.lru import create_lru_loader
+from pkg.data.prefetch import create_prefetching_loader, PREFETCH_CHUNK_SIZE
+from pkg.forecast import get_barcode_forecast, get_barcode_forecasts, get_category_forecasts, get_mean_forecast, \
+    get_mean_forecasts
+from pkg.forecast.kernel import get_forecasts
+from pkg.utils.checkpoint import create_checkpointer, get_checkpoint_file, get_run_fingerprint, open_output, \
+    read_checkpoint, remove_checkpoint
+from pkg.utils.console import panic
+from pkg.utils.files import read_file, iter_csv_rows
+from pkg.utils.pool import map_ordered, report_progress
+from pkg.utils.days import to_day_ordinal
+from pkg.utils.sales import create_sales_series
+from pkg.utils.shard import is_in_shard
+from pkg.utils.stages import count, create_profile_report, enable_profiling, get_slowest_series, merge_profile, \
+    print_profile_report, record_series, stage, take_profile, DEFAULT_SLOWEST_SERIES
 from progress.bar import ChargingBar
-from sh import Command
-
-wc: Command
-awk: Command
-try:
-    from sh import wc, sed
-except ImportError as e:
-    write_stderr(f'{str(e)}\n')
 
 
 CONFIG = None
+LOAD_SALES = None
+LOAD_CATEGORY_SALES = None
+OPTIONS = None
+MAX_UNIT_REQUESTS = 1000
 
 
 def do_forecast(algorithm, barcode_dataframe, forecast_from_date, forecast_before_date):
+    # One period is summed from the daily forecasts of the scalar functions, in their order. Whether the
+    # default algorithm applies is planned upfront, as for many periods, instead of failing in it
     forecast = 0.0
-
+    use_mean_forecast = algorithm == 'mean'
     if algorithm == 'default':
-        use_mean_forecast = False
-        # noinspection PyBroadException
-        try:
-            barcode_forecast = get_barcode_forecast(barcode_dataframe, forecast_from_date, forecast_before_date)
-            if barcode_forecast is not None:
-                forecast = barcode_forecast.sum()
-            else:
-                use_mean_forecast = True
-        except:
-            use_mean_forecast = True
-
-        if use_mean_forecast:
-            # noinspection TryExceptPass, PyBroadException
-            try:
-                mean_forecast = get_mean_forecast(barcode_dataframe, forecast_from_date, forecast_before_date)
-                if mean_forecast is not None:
-                    forecast = mean_forecast.sum()
-            except:
-                pass
-
-    elif algorithm == 'mean':
-        # noinspection TryExceptPass, PyBroadException
-        try:
-            mean_forecast = get_mean_forecast(barcode_dataframe, forecast_from_date, forecast_before_date)
-            if mean_forecast is not None:
-                forecast = mean_forecast.sum()
-        except:
-            pass
-
+        days = max(to_day_ordinal(forecast_before_date) - to_day_ordinal(forecast_from_date), 0)
+        use_mean_forecast = math.isnan(get_barcode_forecasts(barcode_dataframe, [forecast_from_date], days)[0])
+        if not use_mean_forecast:
+            forecast = get_barcode_forecast(barcode_dataframe, forecast_from_date, forecast_before_date).sum()
+    if use_mean_forecast:
+        forecast = get_mean_forecast(barcode_dataframe, forecast_from_date, forecast_before_date).sum()
     return round(forecast, 2)
 
 
-def process_default(out_file, algorithm):
+def do_forecasts(algorithm, barcode_dataframe, forecast_from_dates, days, category_dataframe=None):
+    # `days` is one horizon for all dates or a list with a horizon per date.
+    # With a category frame the default algorithm tries the category one before the mean one
+    if not isinstance(days, list):
+        days = [days] * len(forecast_from_dates)
+
+    forecasts = [math.nan] * len(forecast_from_dates)
+    if algorithm == 'default':
+        forecasts = get_barcode_forecasts(barcode_dataframe, forecast_from_dates, days).tolist()
+
+    if algorithm == 'category' or (algorithm == 'default' and category_dataframe is not None):
+        fallback = [i for i, forecast in enumerate(forecasts) if math.isnan(forecast)]
+        if fallback:
+            if algorithm == 'default':
+                count('forecast.category_fallbacks', len(fallback))
+            category_forecasts = get_category_forecasts(barcode_dataframe,
+                                                        category_dataframe,
+                                                        [forecast_from_dates[i] for i in fallback],
+                                                        [days[i] for i in fallback])
+            for i, forecast in zip(fallback, category_forecasts.tolist()):
+                forecasts[i] = forecast
+
+    fallback = [i for i, forecast in enumerate(forecasts) if math.isnan(forecast)]
+    if fallback:
+        if algorithm != 'mean':
+            count('forecast.mean_fallbacks', len(fallback))
+        mean_forecasts = get_mean_forecasts(barcode_dataframe,
+                                            [forecast_from_dates[i] for i in fallback],
+                                            [days[i] for i in fallback])
+        for i, forecast in zip(fallback, mean_forecasts.tolist()):
+            forecasts[i] = forecast
+    return [round(forecast, 2) for forecast in forecasts]
+
+
+def get_unit_requests(mode, requests):
+    # (origin, days) pairs forecast for one series
+    if mode == 'short':
+        return [(arrow.get(date, 'YYYY-MM-DD').date(), days) for date, days in requests]
+    return [(arrow.get(period['date'], 'DD.MM.YYYY').date(), period['days']) for period in CONFIG['periods']]
+
+
+def create_unit_rows(mode, store_id, barcode, forecasts):
+    if mode == 'short':
+        return [[int(round(forecast))] for forecast in forecasts]
+    return [[store_id, barcode, period['date'], period['days'], forecast]
+            for period, forecast in zip(CONFIG['periods'], forecasts)]
+
+
+def do_kernel_forecasts(algorithm, sales, unit_requests, category_sales=None):
+    # All requests of all series in one vectorized pass
+    series = [i for i, requests in enumerate(unit_requests) for _ in requests]
+    origins = [to_day_ordinal(origin) for requests in unit_requests for origin, _ in requests]
+    horizons = [days for requests in unit_requests for _, days in requests]
+    forecasts = get_forecasts(algorithm, sales, series, origins, horizons, category_sales)
+    forecasts = [round(forecast, 2) for forecast in forecasts.tolist()]
+    bounds = list(itertools.accumulate([0] + [len(requests) for requests in unit_requests]))
+    return [forecasts[beg:end] for beg, end in zip(bounds, bounds[1:])]
+
+
+def forecast_barcodes(mode, algorithm, store_id, units):
+    global CONFIG, LOAD_CATEGORY_SALES, LOAD_SALES, OPTIONS
+
+    with stage('medivh.load'):
+        dfs = LOAD_SALES(store_id, [barcode for barcode, _ in units])
+    categories = None
+    if LOAD_CATEGORY_SALES:
+        with stage('medivh.load_category'):
+            categories = LOAD_CATEGORY_SALES(store_id, [barcode for barcode, _ in units])
+    unit_requests = [get_unit_requests(mode, requests) for _, requests in units]
+    if OPTIONS['kernel']:
+        sales = [create_sales_series(dfs[(store_id, barcode)]) for barcode, _ in units]
+        category_sales = [categories[(store_id, barcode)] for barcode, _ in units] if categories else None
+        unit_forecasts = do_kernel_forecasts(algorithm, sales, unit_requests, category_sales)
+    else:
+        unit_forecasts = []
+        for (barcode, requests), origin_requests in zip(units, unit_requests):
+            start = time.perf_counter()
+            unit_forecasts.append(do_forecasts(algorithm,
+                                               dfs[(store_id, barcode)],
+                                               [origin for origin, _ in origin_requests],
+                                               [days for _, days in origin_requests],
+                                               categories[(store_id, barcode)] if categories else None))
+            record_series((store_id, barcode, tuple(requests or ())), time.perf_counter() - start)
+
+    result = []
+    for (barcode, _), forecasts in zip(units, unit_forecasts):
+        rows = create_unit_rows(mode, store_id, barcode, forecasts)
+        report_progress(store_id, barcode, len(rows))
+        result.append(rows)
+    count('medivh.series', len(units))
+    count('medivh.forecasts', sum(len(rows) for rows in result))
+    return result
+
+
+def forecast_barcodes_profiled(mode, algorithm, store_id, units):
+    # Stage timings collected by a worker process travel back with its results
+    return forecast_barcodes(mode, algorithm, store_id, units), take_profile()
+
+
+def init_worker(config, options, prefetch_keys=None):
+    global CONFIG, LOAD_CATEGORY_SALES, LOAD_SALES, OPTIONS
+    CONFIG = config
+    OPTIONS = options
+    enable_profiling(options['profile'], max(options['cprofile'], DEFAULT_SLOWEST_SERIES))
+    LOAD_SALES = create_sales_loader(config['mysql'], options['cache_dir'], options['refresh_cache'], series=True)
+    if options['series_cache'] > 0:
+        LOAD_SALES = create_lru_loader(LOAD_SALES, options['series_cache'], options['series_cache_mb'] * 1024 * 1024)
+    if prefetch_keys and options['prefetch'] > 0:
+        LOAD_SALES = create_prefetching_loader(LOAD_SALES, prefetch_keys, options['prefetch'])
+    LOAD_CATEGORY_SALES = create_category_sales_loader(config['mysql']) if options['category'] else None
+
+
+def split_units(units, chunk_size):
+    # Consecutive (store, barcode, requests) units of one store are loaded and forecast together
+    chunk = []
+    for store_id, barcode, requests in units:
+        if chunk and (chunk[0][0] != store_id or len(chunk) >= chunk_size):
+            yield chunk[0][0], [(b, r) for _, b, r in chunk]
+            chunk = []
+        chunk.append((store_id, barcode, requests))
+    if chunk:
+        yield chunk[0][0], [(b, r) for _, b, r in chunk]
+
+
+def group_requests(rows, max_requests=MAX_UNIT_REQUESTS):
+    # Consecutive rows of one series become one unit, so their origins share the work
+    unit = None
+    for store_id, barcode, date, days in rows:
+        if unit and unit[:2] == (store_id, barcode) and len(unit[2]) < max_requests:
+            unit[2].append((date, days))
+        else:
+            if unit:
+                yield unit
+            unit = (store_id, barcode, [(date, days)])
+    if unit:
+        yield unit
+
+
+def process_units(mode, algorithm, units, csv_writer, on_progress, options, on_written=None):
+    # Units may be a generator: chunks, tasks and results are all streamed.
+    # on_written gets the number of units whose rows were just written
+    workers = options['workers']
+    if (workers > 1 or options['prefetch'] > 0) and not options['kernel']:
+        chunk_size = PREFETCH_CHUNK_SIZE
+    else:
+        chunk_size = BULK_CHUNK_SIZE
+
+    chunks = split_units(units, chunk_size)
+    prefetch_keys = None
+    if workers <= 1 and options['prefetch'] > 0:
+        # Serial runs load the next chunks in background threads while the current one is forecast
+        chunks, prefetch_chunks = itertools.tee(chunks)
+        prefetch_keys = ((store_id, [barcode for barcode, _ in chunk]) for store_id, chunk in prefetch_chunks)
+
+    tasks = ((mode, algorithm, store_id, chunk) for store_id, chunk in chunks)
+    for result in map_ordered(forecast_barcodes_profiled if options['profile'] else forecast_barcodes,
+                              tasks,
+                              workers,
+                              on_progress,
+                              initializer=init_worker,
+                              initargs=(CONFIG, options, prefetch_keys)):
+        if options['profile']:
+            result, profile = result
+            merge_profile(profile)
+        with stage('medivh.csv_write'):
+            for rows in result:
+                csv_writer.writerows(rows)
+        if on_written:
+            on_written(len(result))
+
+
+def write_profile(out_file, mode, algorithm, options, wall_seconds):
+    report = create_profile_report(wall_seconds)
+    print_profile_report(report)
+    with open(f'{out_file}.profile.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Profile was written to {out_file}.profile.json')
+
+    slowest = get_slowest_series()[:options['cprofile']]
+    if slowest:
+        init_worker(CONFIG, options)
+    for store_id, barcode, requests in slowest:
+        # The series is forecast again on its own, without progress reporting
+        profiler = cProfile.Profile()
+        units = [(barcode, list(requests) if mode == 'short' else None)]
+        next(map_ordered(profiler.runcall, [(forecast_barcodes, mode, algorithm, store_id, units)]))
+        prof_file = f'{out_file}.{store_id}-{barcode}.prof'
+        profiler.dump_stats(prof_file)
+        print(f'cProfile stats of store {store_id} barcode {barcode} were written to {prof_file}')
+
+
+def open_checkpointed_output(out_file, run, options):
+    # Returns the output file and the number of units it already holds
+    checkpoint = None
+    if options['resume']:
+        try:
+            checkpoint = read_checkpoint(out_file, run)
+        except ValueError as e:
+            panic(f'Cannot resume: {e}')
+        if checkpoint:
+            print(f'Resuming after {checkpoint["units"]} series from {get_checkpoint_file(out_file)}')
+        else:
+            print(f'No checkpoint at {get_checkpoint_file(out_file)}, starting over')
+    return open_output(out_file, checkpoint), checkpoint['units'] if checkpoint else 0
+
+
+def create_run_options(args):
+    # Options of process_default and process_short from the command line arguments
+    return {
+        'workers': args.workers,
+        'cache_dir': args.cache_dir,
+        'refresh_cache': args.refresh_cache,
+        'prefetch': args.prefetch,
+        'series_cache': args.series_cache,
+        'series_cache_mb': args.series_cache_mb,
+        'kernel': args.kernel,
+        'category': args.algorithm == 'category' or (args.algorithm == 'default' and args.category_fallback),
+        'profile': args.profile,
+        'cprofile': args.cprofile,
+        'shard': args.shard,
+        'resume': args.resume,
+        'checkpoint_interval': args.checkpoint_interval,
+    }
+
+
+def process_default(out_file, algorithm, options):
     global CONFIG
 
-    csv_file = open(out_file, 'w', newline='')
+    run = get_run_fingerprint(mode='default', algorithm=algorithm, config=CONFIG,
+                              category=options['category'], shard=options['shard'])
+    csv_file, done_units = open_checkpointed_output(out_file, run, options)
     csv_writer = csv.writer(csv_file, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
 
-    engine = create_engine(CONFIG['mysql'])
-
     print(f'Processing with {algorithm} algorithm...')
     stores = CONFIG['stores']
     barcodes = CONFIG['barcodes']
     periods = CONFIG['periods']
-    iter_cnt = len(stores) * len(barcodes) * len(periods)
+    units = [(store_id, barcode, None) for store_id in stores for barcode in barcodes
+             if is_in_shard(options['shard'], store_id, barcode)]
+    iter_cnt = len(units) * len(periods)
     bar = ChargingBar('Waiting...', max=iter_cnt)
     bar.start()
+    bar.next(done_units * len(periods))
 
-    for store_id in stores:
-        for barcode in barcodes:
-            bar.message = f'[Store: {store_id}] {str(barcode).ljust(13, " ")}'
-            bar.update()
-
-            df_barcode = get_barcode_daily_sales(engine, store_id, barcode)
-
-            for period in periods:
-                forecast_from_date = arrow.get(period['date'], 'DD.MM.YYYY')
-                forecast_before_date = forecast_from_date.shift(days=period['days'])
+    def on_progress(store_id, barcode, count):
+        bar.message = f'[Store: {store_id}] {str(barcode).ljust(13, " ")}'
+        bar.next(count)
 
-                forecast = do_forecast(algorithm, df_barcode, forecast_from_date, forecast_before_date)
-
-                csv_writer.writerow([store_id, barcode, period['date'], period['days'], forecast])
-                bar.next()
+    on_written = create_checkpointer(out_file, csv_file, run, done_units, options['checkpoint_interval'])
+    process_units('default', algorithm, units[done_units:], csv_writer, on_progress, options, on_written)
 
     bar.finish()
     csv_file.close()
-    print(f'\nDone. Result was written to {args.output}')
+    remove_checkpoint(out_file)
+    print(f'\nDone. Result was written to {out_file}')
 
 
-def process_short(out_file, in_file, algorithm):
+def process_short(out_file, in_file, algorithm, options):
     global CONFIG
 
-    beg_date = arrow.get('2019-10-01', 'YYYY-MM-DD')
-    end_date = arrow.get('2020-01-31', 'YYYY-MM-DD')
-    write_stdout(f'Forecast from {beg_date} to {end_date}\n')  # 123 days
-
-    lines_count = 0
-    if wc and sed:
-        write_stdout(f'Counting {in_file} non-blank lines...  ')
-        lines_count = int(wc(sed(r'/^\s*$/d', in_file), '-l'))
-        print(lines_count)
-    ops_count = lines_count * 123
-
-    out_csv_file = open(out_file, 'w', newline='')
-    in_csv_file = open(in_file, 'r', newline='\n')
+    run = get_run_fingerprint(mode='short', algorithm=algorithm, config=CONFIG, category=options['category'],
+                              shard=options['shard'], input=(os.path.abspath(in_file), os.path.getsize(in_file)))
+    out_csv_file, done_units = open_checkpointed_output(out_file, run, options)
     csv_writer = csv.writer(out_csv_file, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
-    csv_reader = csv.reader(in_csv_file, delimiter=',')
 
-    engine = create_engine(CONFIG['mysql'])
     print(f'Processing short output with {algorithm} algorithm...')
 
-    bar = None
-    if ops_count > 0:
-        bar = ChargingBar('Waiting...', max=ops_count)
-        bar.start()
-
-    i = 0
-    dfs = {}
-    for row in csv_reader:
-        if row is not None and len(row):
-            store_id = int(row[0])
-            barcode = int(row[1])
-
-            key = f'{store_id}-{barcode}'
-            try:
-                df_barcode = dfs[key]
-            except KeyError:
-                df_barcode = get_barcode_daily_sales(engine, store_id, barcode)
-                dfs[key] = df_barcode
-
-            for j, d in enumerate(arrow.Arrow.range('day', beg_date, end_date)):
-                forecast_from_date = d
-                forecast_before_date = forecast_from_date.shift(days=5)
-
-                forecast = do_forecast(algorithm, df_barcode, forecast_from_date, forecast_before_date)
-                csv_writer.writerow([int(round(forecast))])
-
-                if bar:
-                    curr_op = i * 123 + j
-                    if curr_op % 5 == 0:
-                        bar.message = f'{curr_op} of {ops_count}'
-                        bar.update()
-                    bar.next()
-            i += 1
+    # Progress is estimated from the input bytes consumed so far, the input is read only once
+    bar = ChargingBar('Waiting...', max=max(os.path.getsize(in_file), 1))
+    bar.start()
+
+    read_count = 0
+    done_count = 0
+
+    def on_read(count):
+        nonlocal read_count
+        read_count += count
+
+    def on_progress(store_id, barcode, count):
+        nonlocal done_count
+        done_count += count
+        bar.message = f'{done_count} forecasts'
+        bar.goto(read_count)
+
+    rows = iter_csv_rows(in_file, on_read=on_read)
+    rows = ((int(row[0]), int(row[1]), row[2], int(row[3])) for row in rows)
+    units = group_requests(row for row in rows if is_in_shard(options['shard'], row[0], row[1]))
+    on_written = create_checkpointer(out_file, out_csv_file, run, done_units, options['checkpoint_interval'])
+    process_units('short', algorithm, itertools.islice(units, done_units, None), csv_writer, on_progress, options,
+                  on_written)
 
     bar.message = 'Done'
-    bar.update()
+    bar.goto(bar.max)
+    bar.finish()
 
     out_csv_file.close()
-    in_csv_file.close()
+    remove_checkpoint(out_file)
 
 
 if __name__ == '__main__':
@@ -169,13 +363,19 @@ if __name__ == '__main__':
         print(f'Config loaded from {args.config}')
 
         if args.output:
+            run_options = create_run_options(args)
+            enable_profiling(args.profile, max(args.cprofile, DEFAULT_SLOWEST_SERIES))
+            start = time.perf_counter()
             if args.short:
                 if args.input:
-                    process_short(args.output, args.input, args.algorithm)
+                    process_short(args.output, args.input, args.algorithm, run_options)
                 else:
                     panic('No input file specified. Use -i option')
             else:
-                process_default(args.output, args.algorithm)
+                process_default(args.output, args.algorithm, run_options)
+            if args.profile:
+                write_profile(args.output, 'short' if args.short else 'default', args.algorithm, run_options,
+                              time.perf_counter() - start)
         else:
             panic('No output file specified. Use -o option')
     else:
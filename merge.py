@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import yaml
+import sys
+from contextlib import ExitStack
+from pkg.arg_parser.merge import create_argparse
+from pkg.utils.console import panic
+from pkg.utils.files import read_file, iter_csv_rows
+from pkg.utils.shard import merge_shard_files
+
+
+def get_config_units(config):
+    # medivh.py and tester.py -g write a row per period for every store and barcode
+    periods = len(config['periods'])
+    return ((store_id, barcode, periods) for store_id in config['stores'] for barcode in config['barcodes'])
+
+
+def get_input_units(in_file):
+    # medivh.py -s writes a row per input row
+    return ((int(row[0]), int(row[1]), 1) for row in iter_csv_rows(in_file))
+
+
+if __name__ == '__main__':
+    if sys.version_info < (3, 8):
+        panic('We need minimum Python version 3.8 to run. Current version: %s.%s.%s' % sys.version_info[:3])
+
+    args = create_argparse()
+    if args.input:
+        units = get_input_units(args.input)
+    elif args.config:
+        units = get_config_units(yaml.safe_load(read_file(args.config)))
+        print(f'Config loaded from {args.config}')
+    else:
+        panic('No config or input file specified. Use -c or -i option')
+
+    with ExitStack() as stack:
+        shard_files = [stack.enter_context(open(shard_file, 'rb')) for shard_file in args.shards]
+        out_file = stack.enter_context(open(args.output, 'wb'))
+        try:
+            merge_shard_files(shard_files, units, out_file)
+        except ValueError as e:
+            panic(f'Shards do not match: {e}')
+    print(f'{len(args.shards)} shards were merged into {args.output}')
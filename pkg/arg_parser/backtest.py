@@ -0,0 +1,63 @@
+import argparse
+from pkg.utils.shard import parse_shard
+
+
+def create_argparse():
+    parser = argparse.ArgumentParser(description='Forecasts backtest')
+    parser.add_argument(
+        '-c',
+        '--config',
+        required=True,
+        help='Path to config file'
+    )
+    parser.add_argument(
+        '-a',
+        '--algorithms',
+        nargs='+',
+        choices=['default', 'mean', 'category'],
+        default=['default', 'mean'],
+        help='Algorithms to compare'
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        help='Path to output JSON file with the report'
+    )
+    parser.add_argument(
+        '--series-output',
+        help='Path to output CSV file with the metrics of every series'
+    )
+    parser.add_argument(
+        '--roll',
+        type=int,
+        default=1,
+        help='Number of origins of every configured period, the first one is the period date'
+    )
+    parser.add_argument(
+        '--step',
+        type=int,
+        default=7,
+        help='Days between the rolled origins of a period'
+    )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes'
+    )
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        help='Process only slice i of N disjoint slices of the series, as i/N'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='Path to local sales cache directory'
+    )
+    parser.add_argument(
+        '--refresh-cache',
+        action='store_true',
+        help='Drop cached sales if the database has newer data'
+    )
+    return parser.parse_args()
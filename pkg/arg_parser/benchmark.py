@@ -0,0 +1,87 @@
+import argparse
+
+
+def create_argparse():
+    parser = argparse.ArgumentParser(description='Forecasts performance benchmark on synthetic sales')
+    parser.add_argument(
+        '-s',
+        '--stores',
+        type=int,
+        default=5,
+        help='Number of synthetic stores'
+    )
+    parser.add_argument(
+        '-b',
+        '--barcodes',
+        type=int,
+        default=100,
+        help='Number of synthetic barcodes in every store'
+    )
+    parser.add_argument(
+        '-y',
+        '--years',
+        type=int,
+        default=3,
+        help='Years of sales history'
+    )
+    parser.add_argument(
+        '-e',
+        '--end',
+        default='2020-03-31',
+        help='Last day of sales history, YYYY-MM-DD'
+    )
+    parser.add_argument(
+        '-p',
+        '--periods',
+        type=int,
+        default=8,
+        help='Number of forecast periods for every series'
+    )
+    parser.add_argument(
+        '--sample',
+        type=int,
+        default=100,
+        help='Number of series the forecast functions are timed on'
+    )
+    parser.add_argument(
+        '-r',
+        '--repeat',
+        type=int,
+        default=3,
+        help='Number of end to end runs of every mode'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Random seed of the synthetic sales'
+    )
+    parser.add_argument(
+        '-a',
+        '--algorithm',
+        choices=['default', 'mean'],
+        default='default',
+        help='Algorithm of end to end runs'
+    )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes of end to end runs'
+    )
+    parser.add_argument(
+        '--kernel',
+        action='store_true',
+        help='Run end to end with the vectorized kernel'
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        help='Path to output JSON file'
+    )
+    parser.add_argument(
+        '--data-dir',
+        help='Directory for the synthetic sales cache, a temporary one is used and removed if not set'
+    )
+    return parser.parse_args()
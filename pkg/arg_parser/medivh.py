@@ -1,7 +1,10 @@
 import argparse
+from pkg.utils.checkpoint import CHECKPOINT_INTERVAL
+from pkg.utils.shard import parse_shard
+from typing import List
 
 
-def create_argparse():
+def create_argparse(args: List[str] = None):
     parser = argparse.ArgumentParser(description='Sales forecasts')
     parser.add_argument(
         '-c',
@@ -29,8 +32,79 @@ def create_argparse():
     parser.add_argument(
         '-a',
         '--algorithm',
-        choices=['default', 'mean'],
+        choices=['default', 'mean', 'category'],
         default='default',
         help='Algorithm to get forecasts'
     )
-    return parser.parse_args()
+    parser.add_argument(
+        '--category-fallback',
+        action='store_true',
+        help='Let the default algorithm try the category one before the mean one'
+    )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes'
+    )
+    parser.add_argument(
+        '--prefetch',
+        type=int,
+        default=2,
+        help='Number of series chunks loaded ahead in a serial run, 0 to disable'
+    )
+    parser.add_argument(
+        '--series-cache',
+        type=int,
+        default=1000,
+        help='Number of recently used series kept in memory, 0 to disable'
+    )
+    parser.add_argument(
+        '--series-cache-mb',
+        type=int,
+        default=0,
+        help='Memory budget of recently used series in megabytes, 0 for no limit'
+    )
+    parser.add_argument(
+        '--kernel',
+        action='store_true',
+        help='Forecast every loaded chunk of series in one vectorized pass'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print time spent per stage and write it to <output>.profile.json'
+    )
+    parser.add_argument(
+        '--cprofile',
+        type=int,
+        default=0,
+        help='With --profile, write cProfile stats of this many slowest series to <output>.<store>-<barcode>.prof'
+    )
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        help='Process only slice i of N disjoint slices of the series, as i/N'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue an interrupted run from the checkpoint next to its output'
+    )
+    parser.add_argument(
+        '--checkpoint-interval',
+        type=float,
+        default=CHECKPOINT_INTERVAL,
+        help='Seconds between checkpoints of the output, 0 to write one after every chunk'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='Path to local sales cache directory'
+    )
+    parser.add_argument(
+        '--refresh-cache',
+        action='store_true',
+        help='Drop cached sales if the database has newer data'
+    )
+    return parser.parse_args(args)
@@ -0,0 +1,27 @@
+import argparse
+
+
+def create_argparse():
+    parser = argparse.ArgumentParser(description='Merge of sharded outputs')
+    parser.add_argument(
+        'shards',
+        nargs='+',
+        help='Output files of shards 0/N..N-1/N, in this order'
+    )
+    parser.add_argument(
+        '-c',
+        '--config',
+        help='Path to config file of medivh.py and tester.py -g runs'
+    )
+    parser.add_argument(
+        '-i',
+        '--input',
+        help='Path to input CSV file of medivh.py -s runs'
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        required=True,
+        help='Path to merged output CSV file'
+    )
+    return parser.parse_args()
@@ -0,0 +1,24 @@
+import argparse
+from pkg.data.refresh import DEFAULT_OVERLAP_DAYS
+
+
+def create_argparse():
+    parser = argparse.ArgumentParser(description='Daily sales tables refresh')
+    parser.add_argument(
+        '-c',
+        '--config',
+        required=True,
+        help='Path to config file'
+    )
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='Aggregate all sales again instead of the ones added since the last refresh'
+    )
+    parser.add_argument(
+        '--overlap-days',
+        type=int,
+        default=DEFAULT_OVERLAP_DAYS,
+        help=f'Days before the last refreshed one to aggregate again for late rows (default: {DEFAULT_OVERLAP_DAYS})'
+    )
+    return parser.parse_args()
@@ -0,0 +1,62 @@
+import argparse
+
+
+def create_argparse():
+    parser = argparse.ArgumentParser(description='Sales forecasts service')
+    parser.add_argument(
+        '-c',
+        '--config',
+        required=True,
+        help='Path to config file'
+    )
+    parser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='Address to listen on'
+    )
+    parser.add_argument(
+        '-p',
+        '--port',
+        type=int,
+        default=8080,
+        help='Port to listen on'
+    )
+    parser.add_argument(
+        '--socket',
+        help='Path to a Unix socket to listen on instead of a TCP port'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='Path to local sales cache directory'
+    )
+    parser.add_argument(
+        '--series-cache',
+        type=int,
+        default=100000,
+        help='Number of recently used series kept in memory, 0 to disable'
+    )
+    parser.add_argument(
+        '--result-cache',
+        type=int,
+        default=1000000,
+        help='Number of computed forecasts kept in memory'
+    )
+    parser.add_argument(
+        '--batch-wait-ms',
+        type=float,
+        default=2.0,
+        help='Time to collect concurrent requests into one batch'
+    )
+    parser.add_argument(
+        '--watermark-interval',
+        type=float,
+        default=60.0,
+        help='Seconds between checks for new sales days, 0 to disable'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=300.0,
+        help='Seconds to wait for the forecasts of one request'
+    )
+    return parser.parse_args()
@@ -0,0 +1,51 @@
+import argparse
+
+
+def create_argparse():
+    parser = argparse.ArgumentParser(description='Incremental forecast state')
+    parser.add_argument(
+        '--init',
+        action='store_true',
+        help='Create the state from the full sales history'
+    )
+    parser.add_argument(
+        '-u',
+        '--update',
+        action='store_true',
+        help='Advance the state with the sales days added since the last update'
+    )
+    parser.add_argument(
+        '-f',
+        '--forecast',
+        action='store_true',
+        help='Forecast the periods after the last processed day from the state'
+    )
+    parser.add_argument(
+        '-c',
+        '--config',
+        required=True,
+        help='Path to config file'
+    )
+    parser.add_argument(
+        '-s',
+        '--state',
+        required=True,
+        help='Path to state file'
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        help='Path to output CSV file'
+    )
+    parser.add_argument(
+        '-a',
+        '--algorithm',
+        choices=['default', 'mean'],
+        default='default',
+        help='Algorithm to get forecasts'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='Path to local sales cache directory, used by --init'
+    )
+    return parser.parse_args()
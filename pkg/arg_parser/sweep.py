@@ -0,0 +1,88 @@
+import argparse
+from pkg.forecast.kernel import DEFAULT_PARAMS
+from pkg.utils.shard import parse_shard
+
+
+def create_argparse():
+    parser = argparse.ArgumentParser(description='Forecast parameters sweep')
+    parser.add_argument(
+        '-c',
+        '--config',
+        required=True,
+        help='Path to config file'
+    )
+    parser.add_argument(
+        '-a',
+        '--algorithm',
+        choices=['default', 'mean', 'category'],
+        default='default',
+        help='Algorithm to tune'
+    )
+    parser.add_argument(
+        '--window',
+        type=int,
+        nargs='+',
+        default=[DEFAULT_PARAMS.window],
+        help='Days of the moving average'
+    )
+    parser.add_argument(
+        '--lookback',
+        type=int,
+        nargs='+',
+        default=[DEFAULT_PARAMS.lookback],
+        help='Months before the origin the sales of a series must reach, swept for the category algorithm only'
+    )
+    parser.add_argument(
+        '--padding',
+        type=int,
+        nargs='+',
+        default=[DEFAULT_PARAMS.padding],
+        help='Days before the lookback day whose sales feed the moving averages of the default algorithm, '
+             'never swept as it does not change the forecasts'
+    )
+    parser.add_argument(
+        '--lag',
+        type=int,
+        nargs='+',
+        default=[DEFAULT_PARAMS.lag],
+        help='Months between a day and the same day of the season before'
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        help='Path to output JSON file with the report'
+    )
+    parser.add_argument(
+        '--roll',
+        type=int,
+        default=1,
+        help='Number of origins of every configured period, the first one is the period date'
+    )
+    parser.add_argument(
+        '--step',
+        type=int,
+        default=7,
+        help='Days between the rolled origins of a period'
+    )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes'
+    )
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        help='Process only slice i of N disjoint slices of the series, as i/N'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='Path to local sales cache directory'
+    )
+    parser.add_argument(
+        '--refresh-cache',
+        action='store_true',
+        help='Drop cached sales if the database has newer data'
+    )
+    return parser.parse_args()
@@ -1,4 +1,5 @@
 import argparse
+from pkg.utils.shard import parse_shard
 
 
 def create_argparse():
@@ -41,4 +42,30 @@ def create_argparse():
         '--image',
         help='Path to image file with plot result'
     )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes generating real sales'
+    )
+    parser.add_argument(
+        '--headless',
+        action='store_true',
+        help='Print metrics only, without plotting'
+    )
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        help='Process only slice i of N disjoint slices of the series, as i/N'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='Path to local sales cache directory'
+    )
+    parser.add_argument(
+        '--refresh-cache',
+        action='store_true',
+        help='Drop cached sales if the database has newer data'
+    )
     return parser.parse_args()
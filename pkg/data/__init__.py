@@ -1,34 +1,172 @@
 import pandas as pd
 from pandas import DataFrame
-from pkg.utils.df import create_df_indexed_by_date
-from sqlalchemy import create_engine as sqlalchemy_create_engine
+from pkg.utils.df import create_df, create_df_indexed_by_date, IDX_COL
+from pkg.utils.stages import count, stage
+from sqlalchemy import bindparam, create_engine as sqlalchemy_create_engine, text
+from typing import Dict, Iterable, Tuple
 
+BULK_CHUNK_SIZE = 1000
 
-def create_engine(db):
+
+def create_engine(db, **options):
+    # options go to SQLAlchemy, e.g. the pool settings of a long-running process
     db_path = '%s:%s@%s:%s/%s' % (db['user'], db['pass'], db['host'], db['port'], db['schema'])
     db_secured_path = '%s:%s@%s:%s/%s' % (db['user'], '*****', db['host'], db['port'], db['schema'])
-    engine = sqlalchemy_create_engine(f'mysql+mysqlconnector://{db_path}')
+    engine = sqlalchemy_create_engine(f'mysql+mysqlconnector://{db_path}', **options)
     print(f'Connected to MySQL at {db_secured_path}\n')
     return engine
 
 
+def create_empty_daily_sales() -> DataFrame:
+    return create_df_indexed_by_date(create_df([]))
+
+
 def get_barcode_daily_sales(engine, store_id: int, code: int) -> DataFrame:
-    data = pd.read_sql(f'select date as date_idx, '
-                       f'       quantity '
-                       f'from   medivh.sales__by_barcode_by_day '
-                       f'where  barcode = {code} and store_id = {store_id}', con=engine)
+    data = pd.read_sql(text('select date as date_idx, '
+                            '       quantity '
+                            'from   medivh.sales__by_barcode_by_day '
+                            'where  barcode = :code and store_id = :store_id'),
+                       con=engine,
+                       params={'code': code, 'store_id': store_id})
     return create_df_indexed_by_date(data)
 
 
+def get_barcodes_daily_sales(engine,
+                             store_ids: Iterable[int],
+                             codes: Iterable[int],
+                             chunk_size: int = BULK_CHUNK_SIZE
+                             ) -> Dict[Tuple[int, int], DataFrame]:
+    store_ids = sorted(set(store_ids))
+    codes = sorted(set(codes))
+    query = text('select store_id, '
+                 '       barcode, '
+                 '       date as date_idx, '
+                 '       quantity '
+                 'from   medivh.sales__by_barcode_by_day '
+                 'where  store_id in :store_ids and barcode in :codes').bindparams(
+        bindparam('store_ids', expanding=True),
+        bindparam('codes', expanding=True)
+    )
+
+    result = {(store_id, code): create_empty_daily_sales() for store_id in store_ids for code in codes}
+    if not result:
+        return result
+
+    for i in range(0, len(codes), chunk_size):
+        with stage('data.read_sql'):
+            data = pd.read_sql(query, con=engine, params={'store_ids': store_ids, 'codes': codes[i:i + chunk_size]})
+        count('data.sql_rows', len(data))
+        for (store_id, code), group in data.groupby(['store_id', 'barcode']):
+            result[(int(store_id), int(code))] = create_df_indexed_by_date(group[[IDX_COL, 'quantity']])
+    return result
+
+
+def get_daily_sales_since(engine,
+                          store_ids: Iterable[int],
+                          codes: Iterable[int],
+                          since: str,
+                          chunk_size: int = BULK_CHUNK_SIZE
+                          ) -> DataFrame:
+    # Sales rows of the days from `since` (YYYY-MM-DD) on in the order of the table
+    store_ids = sorted(set(store_ids))
+    codes = sorted(set(codes))
+    query = text('select store_id, '
+                 '       barcode, '
+                 '       date as date_idx, '
+                 '       quantity '
+                 'from   medivh.sales__by_barcode_by_day '
+                 'where  date >= :since and store_id in :store_ids and barcode in :codes').bindparams(
+        bindparam('store_ids', expanding=True),
+        bindparam('codes', expanding=True)
+    )
+
+    parts = []
+    for i in range(0, len(codes), chunk_size):
+        with stage('data.read_sql'):
+            parts.append(pd.read_sql(query, con=engine,
+                                     params={'since': since, 'store_ids': store_ids, 'codes': codes[i:i + chunk_size]}))
+        count('data.sql_rows', len(parts[-1]))
+    if not parts:
+        return DataFrame(columns=['store_id', 'barcode', IDX_COL, 'quantity'])
+    return pd.concat(parts, ignore_index=True)
+
+
+def get_sales_watermark(engine) -> str:
+    data = pd.read_sql(text('select max(date) as watermark '
+                            'from   medivh.sales__by_barcode_by_day'), con=engine)
+    watermark = data['watermark'][0]
+    return None if pd.isnull(watermark) else str(pd.Timestamp(watermark).date())
+
+
 def get_category_daily_sales(engine, store_id: int, code: int) -> DataFrame:
-    data = pd.read_sql(f'select sc.date as date_idx, '
-                       f'       sc.quantity '
-                       f'from   medivh.sales__by_category_by_day sc '
-                       f'where  sc.store_id = {store_id} and '
-                       f'       sc.category_id = (select p.category_id '
-                       f'                         from   medivh.product p '
-                       f'                         where  p.barcode = {code} and '
-                       f'                                p.store_group_id = (select s.store_group_id '
-                       f'                                                    from   medivh.store s '
-                       f'                                                    where  s.id = sc.store_id)) ', con=engine)
+    data = pd.read_sql(text('select sc.date as date_idx, '
+                            '       sc.quantity '
+                            'from   medivh.sales__by_category_by_day sc '
+                            '       inner join medivh.store    s on (s.id = sc.store_id) '
+                            '       inner join medivh.product  p on (p.category_id = sc.category_id and '
+                            '                                        p.store_group_id = s.store_group_id) '
+                            'where  sc.store_id = :store_id and p.barcode = :code'),
+                       con=engine,
+                       params={'store_id': store_id, 'code': code})
     return create_df_indexed_by_date(data)
+
+
+def get_barcodes_categories(engine,
+                            store_ids: Iterable[int],
+                            codes: Iterable[int],
+                            chunk_size: int = BULK_CHUNK_SIZE
+                            ) -> Dict[Tuple[int, int], int]:
+    # Category of every (store, barcode) pair in the product list of the store group, if it has one
+    store_ids = sorted(set(store_ids))
+    codes = sorted(set(codes))
+    query = text('select s.id as store_id, '
+                 '       p.barcode, '
+                 '       p.category_id '
+                 'from   medivh.store s '
+                 '       inner join medivh.product p on (p.store_group_id = s.store_group_id) '
+                 'where  s.id in :store_ids and p.barcode in :codes').bindparams(
+        bindparam('store_ids', expanding=True),
+        bindparam('codes', expanding=True)
+    )
+
+    result = {}
+    if not store_ids:
+        return result
+    for i in range(0, len(codes), chunk_size):
+        with stage('data.read_sql'):
+            data = pd.read_sql(query, con=engine, params={'store_ids': store_ids, 'codes': codes[i:i + chunk_size]})
+        for store_id, code, category_id in data.itertuples(index=False):
+            result.setdefault((int(store_id), int(code)), int(category_id))
+    return result
+
+
+def get_categories_daily_sales(engine,
+                               store_ids: Iterable[int],
+                               category_ids: Iterable[int],
+                               chunk_size: int = BULK_CHUNK_SIZE
+                               ) -> Dict[Tuple[int, int], DataFrame]:
+    store_ids = sorted(set(store_ids))
+    category_ids = sorted(set(category_ids))
+    query = text('select store_id, '
+                 '       category_id, '
+                 '       date as date_idx, '
+                 '       quantity '
+                 'from   medivh.sales__by_category_by_day '
+                 'where  store_id in :store_ids and category_id in :category_ids').bindparams(
+        bindparam('store_ids', expanding=True),
+        bindparam('category_ids', expanding=True)
+    )
+
+    result = {(store_id, category_id): create_empty_daily_sales()
+              for store_id in store_ids for category_id in category_ids}
+    if not result:
+        return result
+
+    for i in range(0, len(category_ids), chunk_size):
+        with stage('data.read_sql'):
+            data = pd.read_sql(query, con=engine,
+                               params={'store_ids': store_ids, 'category_ids': category_ids[i:i + chunk_size]})
+        count('data.sql_rows', len(data))
+        for (store_id, category_id), group in data.groupby(['store_id', 'category_id']):
+            result[(int(store_id), int(category_id))] = create_df_indexed_by_date(group[[IDX_COL, 'quantity']])
+    return result
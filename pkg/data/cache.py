@@ -0,0 +1,227 @@
+import fcntl
+import json
+import numpy as np
+import os
+import pandas as pd
+import threading
+from contextlib import contextmanager
+from glob import glob
+from pandas import DataFrame
+from pkg.data import create_engine, create_empty_daily_sales, get_barcodes_daily_sales, get_sales_watermark
+from pkg.data.store import create_sales_store
+from pkg.utils.df import IDX_COL
+from pkg.utils.sales import SalesSeries, create_sales_series_from_days
+from pkg.utils.stages import profiled
+from typing import Callable, Dict, Iterable, Tuple, Union
+
+META_FILE = 'meta.json'
+LOCK_FILE = 'cache.lock'
+SERIES_DTYPE = np.dtype([('barcode', '<i8'), ('date', '<M8[D]'), ('quantity', '<f8')])
+# Dense daily values of a store's series are stored one after the other, values[offset:offset + length]
+# of a barcode's index row are its days from first_day
+SERIES_INDEX_DTYPE = np.dtype([('barcode', '<i8'), ('first_day', '<i8'), ('offset', '<i8'), ('length', '<i8')])
+
+
+@contextmanager
+def lock_cache(cache_dir: str, name: str = LOCK_FILE, exclusive: bool = True):
+    # Guards against concurrent writers from other processes sharing the cache directory
+    with open(os.path.join(cache_dir, name), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def get_store_file(cache_dir: str, store_id: int, ext: str = 'npy') -> str:
+    return os.path.join(cache_dir, f'store-{store_id}.{ext}')
+
+
+def read_json(path: str, default):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return default
+
+
+def write_json(path: str, data):
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def read_watermark(cache_dir: str) -> str:
+    return read_json(os.path.join(cache_dir, META_FILE), {'watermark': None})['watermark']
+
+
+def read_store_codes(cache_dir: str, store_id: int) -> set:
+    return set(read_json(get_store_file(cache_dir, store_id, 'json'), []))
+
+
+def clear_cache(cache_dir: str, watermark: str = None):
+    for path in glob(os.path.join(cache_dir, 'store-*')):
+        os.remove(path)
+    write_json(os.path.join(cache_dir, META_FILE), {'watermark': watermark})
+
+
+def sync_cache_watermark(cache_dir: str, engine):
+    with lock_cache(cache_dir):
+        cached_watermark = read_watermark(cache_dir)
+        watermark = get_sales_watermark(engine)
+        if cached_watermark != watermark:
+            if cached_watermark is not None:
+                print(f'Sales cache is outdated ({cached_watermark} < {watermark}), clearing {cache_dir}')
+            clear_cache(cache_dir, watermark)
+
+
+def load_store_array(cache_dir: str, store_id: int) -> np.ndarray:
+    path = get_store_file(cache_dir, store_id)
+    if os.path.exists(path):
+        return np.load(path, mmap_mode='r')
+    return np.empty(0, dtype=SERIES_DTYPE)
+
+
+def create_series_arrays(arr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Index and dense values of the series of a store array sorted by barcode and date
+    codes, starts = np.unique(arr['barcode'], return_index=True)
+    bounds = np.append(starts, len(arr))
+    index = np.empty(len(codes), dtype=SERIES_INDEX_DTYPE)
+    values = []
+    offset = 0
+    for i, (code, beg, end) in enumerate(zip(codes.tolist(), bounds.tolist(), bounds[1:].tolist())):
+        series = create_sales_series_from_days(arr['date'][beg:end].astype(np.int64), arr['quantity'][beg:end])
+        index[i] = (code, series.first_day, offset, len(series.values))
+        values.append(series.values.astype(float))
+        offset += len(series.values)
+    return index, np.concatenate(values) if values else np.empty(0)
+
+
+def load_store_series(cache_dir: str, store_id: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Caches written before the series files existed have their series built in memory
+    path = get_store_file(cache_dir, store_id, 'values.npy')
+    if os.path.exists(path):
+        return np.load(get_store_file(cache_dir, store_id, 'index.npy')), np.load(path, mmap_mode='r')
+    return create_series_arrays(load_store_array(cache_dir, store_id))
+
+
+def save_array(path: str, arr: np.ndarray):
+    with open(f'{path}.tmp', 'wb') as f:
+        np.save(f, arr)
+    os.replace(f'{path}.tmp', path)
+
+
+def create_df_from_array(arr: np.ndarray) -> DataFrame:
+    if not len(arr):
+        return create_empty_daily_sales()
+    index = pd.DatetimeIndex(arr['date'], name=IDX_COL)
+    return DataFrame({'quantity': arr['quantity']}, index=index)
+
+
+def create_array_from_dfs(store_id: int, dfs: Dict[Tuple[int, int], DataFrame]) -> np.ndarray:
+    parts = []
+    for (df_store_id, code), df in dfs.items():
+        if df_store_id == store_id and not df.empty:
+            part = np.empty(len(df), dtype=SERIES_DTYPE)
+            part['barcode'] = code
+            part['date'] = df.index.values.astype('datetime64[D]')
+            part['quantity'] = df.iloc[:, 0].to_numpy(dtype=float)
+            parts.append(part)
+    return np.concatenate(parts) if parts else np.empty(0, dtype=SERIES_DTYPE)
+
+
+@profiled('data.cache_read')
+def read_barcodes_daily_sales(cache_dir: str, store_id: int, codes: Iterable[int]) -> Dict[Tuple[int, int], DataFrame]:
+    # Series are views over the memory-mapped store file, sorted by barcode and date
+    arr = load_store_array(cache_dir, store_id)
+    result = {}
+    for code in codes:
+        beg, end = np.searchsorted(arr['barcode'], [code, code + 1])
+        result[(store_id, code)] = create_df_from_array(arr[beg:end])
+    return result
+
+
+@profiled('data.cache_read')
+def read_barcodes_sales_series(cache_dir: str,
+                               store_id: int,
+                               codes: Iterable[int]
+                               ) -> Dict[Tuple[int, int], SalesSeries]:
+    # Same as read_barcodes_daily_sales without the frames in between: the values of every series
+    # are a view over the memory-mapped dense values of the store
+    index, values = load_store_series(cache_dir, store_id)
+    result = {}
+    for code in codes:
+        i = int(np.searchsorted(index['barcode'], code))
+        if i < len(index) and index['barcode'][i] == code:
+            _, first_day, offset, length = index[i].tolist()
+            result[(store_id, code)] = SalesSeries(first_day, values[offset:offset + length])
+        else:
+            result[(store_id, code)] = SalesSeries(0, np.empty(0, dtype=np.float32))
+    return result
+
+
+@profiled('data.cache_write')
+def write_barcodes_daily_sales(cache_dir: str, store_id: int, dfs: Dict[Tuple[int, int], DataFrame]):
+    arr = np.array(load_store_array(cache_dir, store_id))
+    arr = arr[~np.isin(arr['barcode'], [code for _, code in dfs])]
+    arr = np.concatenate([arr, create_array_from_dfs(store_id, dfs)])
+    arr = arr[np.lexsort((arr['date'], arr['barcode']))]
+
+    index, values = create_series_arrays(arr)
+    save_array(get_store_file(cache_dir, store_id), arr)
+    save_array(get_store_file(cache_dir, store_id, 'values.npy'), values)
+    save_array(get_store_file(cache_dir, store_id, 'index.npy'), index)
+
+    codes = read_store_codes(cache_dir, store_id) | {code for _, code in dfs}
+    write_json(get_store_file(cache_dir, store_id, 'json'), sorted(codes))
+
+
+def create_sales_loader(db: dict,
+                        cache_dir: str = None,
+                        refresh: bool = False,
+                        series: bool = False,
+                        engine=None
+                        ) -> Callable[[int, Iterable[int]], Dict[Tuple[int, int], Union[DataFrame, SalesSeries]]]:
+    # Loads frames, or SalesSeries when `series` is set. An engine is created on first use unless one is shared
+    synced = False
+    lock = threading.RLock()
+
+    def get_engine():
+        nonlocal engine
+        with lock:
+            if engine is None:
+                engine = create_engine(db)
+        return engine
+
+    def sync_watermark():
+        nonlocal synced
+        with lock:
+            if not synced:
+                sync_cache_watermark(cache_dir, get_engine())
+                synced = True
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        if refresh:
+            sync_watermark()
+
+    def load(store_id: int, codes: Iterable[int]) -> Dict[Tuple[int, int], Union[DataFrame, SalesSeries]]:
+        codes = set(codes)
+        if not cache_dir:
+            dfs = get_barcodes_daily_sales(get_engine(), [store_id], codes)
+            return create_sales_store(dfs) if series else dfs
+
+        if codes - read_store_codes(cache_dir, store_id):
+            sync_watermark()
+            with lock_cache(cache_dir, exclusive=False), lock_cache(cache_dir, f'store-{store_id}.lock'):
+                missing = codes - read_store_codes(cache_dir, store_id)
+                if missing:
+                    dfs = get_barcodes_daily_sales(get_engine(), [store_id], missing)
+                    write_barcodes_daily_sales(cache_dir, store_id, dfs)
+
+        # Files of a store are replaced together under its lock, mapped views outlive the replaced files
+        with lock_cache(cache_dir, exclusive=False), lock_cache(cache_dir, f'store-{store_id}.lock', exclusive=False):
+            if series:
+                return read_barcodes_sales_series(cache_dir, store_id, codes)
+            return read_barcodes_daily_sales(cache_dir, store_id, codes)
+
+    return load
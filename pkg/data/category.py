@@ -0,0 +1,55 @@
+import numpy as np
+import threading
+from collections import OrderedDict
+from pkg.data import create_engine, get_barcodes_categories, get_categories_daily_sales
+from pkg.utils.sales import SalesSeries, create_sales_series
+from pkg.utils.stages import count
+from typing import Callable, Dict, Iterable, Tuple
+
+DEFAULT_CATEGORY_ENTRIES = 10000
+NO_CATEGORY_SALES = SalesSeries(0, np.empty(0, dtype=np.float32))
+
+
+def create_category_sales_loader(db: dict,
+                                 max_entries: int = DEFAULT_CATEGORY_ENTRIES,
+                                 engine=None
+                                 ) -> Callable[[int, Iterable[int]], Dict[Tuple[int, int], SalesSeries]]:
+    # Loads the category series of (store, barcode) pairs. Every (store, category) series is fetched
+    # once and shared by all the barcodes of the category, the least recently used ones are evicted
+    # after max_entries. Barcodes without a category get an empty series
+    categories = {}
+    entries = OrderedDict()
+    lock = threading.RLock()
+
+    def get_engine():
+        nonlocal engine
+        with lock:
+            if engine is None:
+                engine = create_engine(db)
+        return engine
+
+    def load(store_id: int, codes: Iterable[int]) -> Dict[Tuple[int, int], SalesSeries]:
+        codes = list(codes)
+        with lock:
+            missing = [code for code in codes if (store_id, code) not in categories]
+            if missing:
+                found = get_barcodes_categories(get_engine(), [store_id], missing)
+                categories.update({(store_id, code): found.get((store_id, code)) for code in missing})
+
+            category_ids = {categories[(store_id, code)] for code in codes} - {None}
+            for category_id in category_ids:
+                if (store_id, category_id) in entries:
+                    entries.move_to_end((store_id, category_id))
+            missing = [category_id for category_id in category_ids if (store_id, category_id) not in entries]
+            if missing:
+                for key, df in get_categories_daily_sales(get_engine(), [store_id], missing).items():
+                    entries[key] = create_sales_series(df)
+            count('data.category_series', len(missing))
+
+            result = {(store_id, code): entries.get((store_id, categories[(store_id, code)]), NO_CATEGORY_SALES)
+                      for code in codes}
+            while len(entries) > max_entries:
+                entries.popitem(last=False)
+        return result
+
+    return load
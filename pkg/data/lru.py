@@ -0,0 +1,57 @@
+import threading
+from collections import OrderedDict
+from pandas import DataFrame
+from pkg.utils.sales import SalesSeries
+from typing import Callable, Dict, Iterable, Tuple, Union
+
+DEFAULT_LRU_ENTRIES = 1000
+
+
+def get_size(data: Union[DataFrame, SalesSeries]) -> int:
+    if isinstance(data, SalesSeries):
+        return data.values.nbytes
+    return int(data.memory_usage(deep=True).sum())
+
+
+def create_lru_loader(load: Callable[[int, Iterable[int]], Dict[Tuple[int, int], Union[DataFrame, SalesSeries]]],
+                      max_entries: int = DEFAULT_LRU_ENTRIES,
+                      max_bytes: int = 0
+                      ) -> Callable[[int, Iterable[int]], Dict[Tuple[int, int], Union[DataFrame, SalesSeries]]]:
+    # Keeps the most recently used series in memory, evicting the oldest ones once
+    # max_entries series or max_bytes of frames (when set) are held
+    entries = OrderedDict()
+    sizes = {}
+    total_bytes = 0
+    lock = threading.Lock()
+
+    def evict():
+        nonlocal total_bytes
+        while entries and (len(entries) > max_entries or (max_bytes and total_bytes > max_bytes)):
+            key, _ = entries.popitem(last=False)
+            total_bytes -= sizes.pop(key)
+
+    def lru_load(store_id: int, codes: Iterable[int]) -> Dict[Tuple[int, int], Union[DataFrame, SalesSeries]]:
+        nonlocal total_bytes
+        codes = list(codes)
+        result = {}
+        with lock:
+            for code in codes:
+                if (store_id, code) in entries:
+                    entries.move_to_end((store_id, code))
+                    result[(store_id, code)] = entries[(store_id, code)]
+
+        missing = [code for code in codes if (store_id, code) not in result]
+        if missing:
+            loaded = load(store_id, missing)
+            result.update(loaded)
+            with lock:
+                for key, df in loaded.items():
+                    if key not in entries:
+                        sizes[key] = get_size(df)
+                        total_bytes += sizes[key]
+                    entries[key] = df
+                    entries.move_to_end(key)
+                evict()
+        return result
+
+    return lru_load
@@ -0,0 +1,41 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pandas import DataFrame
+from typing import Callable, Dict, Iterable, List, Tuple
+
+DEFAULT_PREFETCH_DEPTH = 2
+PREFETCH_CHUNK_SIZE = 100
+
+
+def create_prefetching_loader(load: Callable[[int, Iterable[int]], Dict[Tuple[int, int], DataFrame]],
+                              keys: List[Tuple[int, List[int]]],
+                              depth: int = DEFAULT_PREFETCH_DEPTH
+                              ) -> Callable[[int, Iterable[int]], Dict[Tuple[int, int], DataFrame]]:
+    # Loads the (store_id, barcodes) keys in the order they will be requested, keeping
+    # at most `depth` of them in flight or waiting to be consumed
+    executor = ThreadPoolExecutor(max_workers=depth)
+    pending = deque()
+    upcoming = iter(keys)
+
+    def fill():
+        while len(pending) < depth:
+            try:
+                store_id, codes = next(upcoming)
+            except StopIteration:
+                return
+            pending.append(((store_id, list(codes)), executor.submit(load, store_id, codes)))
+
+    def prefetching_load(store_id: int, codes: Iterable[int]) -> Dict[Tuple[int, int], DataFrame]:
+        codes = list(codes)
+        fill()
+        if pending and pending[0][0] == (store_id, codes):
+            _, future = pending.popleft()
+            result = future.result()
+        else:
+            result = load(store_id, codes)
+        fill()
+        if not pending:
+            executor.shutdown(wait=False)
+        return result
+
+    return prefetching_load
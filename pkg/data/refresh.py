@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from typing import Tuple
+
+WATERMARK_NAME = 'sale__product'
+DEFAULT_OVERLAP_DAYS = 2
+
+# Both daily tables get the sales of the sale__product rows with since <= sale_time <= until. The range
+# on the raw column can use an index on sale_time, and days are grouped by date() instead of a string
+BARCODE_SALES_QUERY = ('select sp.store_id, '
+                       '       sp.barcode, '
+                       '       date(sp.sale_time) as date, '
+                       '       sum(sp.quantity) as quantity '
+                       'from   medivh.sale__product sp '
+                       'where  {range} '
+                       'group by sp.store_id, sp.barcode, date(sp.sale_time)')
+CATEGORY_SALES_QUERY = ('select sp.store_id, '
+                        '       p.category_id, '
+                        '       date(sp.sale_time) as date, '
+                        '       sum(sp.quantity) as quantity '
+                        'from   medivh.sale__product sp '
+                        '       inner join medivh.store    s on (s.id = sp.store_id) '
+                        '       inner join medivh.product  p on (p.barcode = sp.barcode and '
+                        '                                        p.store_group_id = s.store_group_id) '
+                        'where  {range} '
+                        'group by sp.store_id, p.category_id, date(sp.sale_time)')
+DAILY_TABLES = (
+    ('sales__by_barcode_by_day', ('store_id', 'barcode', 'date'), BARCODE_SALES_QUERY),
+    ('sales__by_category_by_day', ('store_id', 'category_id', 'date'), CATEGORY_SALES_QUERY),
+)
+
+
+def create_upsert_query(dialect: str, table: str, keys: Tuple[str, ...], select: str) -> str:
+    # A refresh aggregates whole days, their sums replace the ones already in the table
+    columns = ', '.join(keys + ('quantity',))
+    insert = f'insert into medivh.{table} ({columns}) select {columns} from ({select}) d '
+    if dialect == 'mysql':
+        return insert + 'on duplicate key update quantity = values(quantity)'
+    return insert + f'where true on conflict ({", ".join(keys)}) do update set quantity = excluded.quantity'
+
+
+def create_refresh_watermark_table(con):
+    con.execute(text('create table if not exists medivh.refresh_watermark ('
+                     '    name      varchar(64) primary key, '
+                     '    watermark datetime not null)'))
+
+
+def read_refresh_watermark(con):
+    return con.execute(text('select watermark from medivh.refresh_watermark where name = :name'),
+                       {'name': WATERMARK_NAME}).scalar()
+
+
+def write_refresh_watermark(con, watermark):
+    con.execute(text('delete from medivh.refresh_watermark where name = :name'), {'name': WATERMARK_NAME})
+    con.execute(text('insert into medivh.refresh_watermark (name, watermark) values (:name, :watermark)'),
+                {'name': WATERMARK_NAME, 'watermark': watermark})
+
+
+def get_overlap_start(watermark, overlap_days: int) -> str:
+    # Midnight `overlap_days` days before the day of the watermark, MySQL returns a datetime, SQLite a string
+    day = datetime.fromisoformat(str(watermark)).date() - timedelta(days=overlap_days)
+    return f'{day.isoformat()} 00:00:00'
+
+
+def refresh_daily_sales(engine, rebuild: bool = False, overlap_days: int = DEFAULT_OVERLAP_DAYS) -> dict:
+    # Aggregates the sale__product rows of the days since the last refresh into the daily tables in one
+    # transaction. The day of the watermark and the `overlap_days` days before it are aggregated again as
+    # a whole, so rows that arrive late or backdated within them are picked up; older ones need a rebuild.
+    # The first refresh, or a rebuild, aggregates all rows into emptied tables
+    with engine.begin() as con:
+        create_refresh_watermark_table(con)
+        watermark = None if rebuild else read_refresh_watermark(con)
+        since = None if watermark is None else get_overlap_start(watermark, overlap_days)
+        until = con.execute(text('select max(sale_time) from medivh.sale__product')).scalar()
+        result = {'since': since, 'until': until, 'rows': {}}
+        if until is None:
+            return result
+
+        if since is None:
+            for table, _, _ in DAILY_TABLES:
+                con.execute(text(f'delete from medivh.{table}'))
+            sales_range = 'sp.sale_time <= :until'
+        else:
+            sales_range = 'sp.sale_time >= :since and sp.sale_time <= :until'
+
+        for table, keys, select in DAILY_TABLES:
+            query = create_upsert_query(engine.dialect.name, table, keys, select.format(range=sales_range))
+            result['rows'][table] = con.execute(text(query), {'since': since, 'until': until}).rowcount
+        write_refresh_watermark(con, until)
+    return result
@@ -0,0 +1,15 @@
+import numpy as np
+import os
+from pkg.forecast.state import ForecastState
+
+
+def read_forecast_state(path: str) -> ForecastState:
+    with np.load(path) as data:
+        return ForecastState(int(data['day']), data['keys'], data['last_days'], data['values'])
+
+
+def write_forecast_state(path: str, state: ForecastState):
+    # Written next to the old state and renamed over it, a failed update keeps the previous one
+    with open(f'{path}.tmp', 'wb') as f:
+        np.savez(f, day=state.day, keys=state.keys, last_days=state.last_days, values=state.values)
+    os.replace(f'{path}.tmp', path)
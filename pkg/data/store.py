@@ -0,0 +1,9 @@
+from pandas import DataFrame
+from pkg.utils.sales import SalesSeries, create_sales_series
+from pkg.utils.stages import profiled
+from typing import Dict, Tuple
+
+
+@profiled('data.to_series')
+def create_sales_store(dfs: Dict[Tuple[int, int], DataFrame]) -> Dict[Tuple[int, int], SalesSeries]:
+    return {key: create_sales_series(df) for key, df in dfs.items()}
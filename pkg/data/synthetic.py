@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from pkg.data import create_empty_daily_sales
+from pkg.data.cache import clear_cache, write_barcodes_daily_sales
+from pkg.utils.days import to_datetime64
+from pkg.utils.df import IDX_COL
+from typing import Dict, List, Tuple
+
+SYNTHETIC_FIRST_BARCODE = 4600000000000
+# Shares of series without sales at all, with sales stopped more than a month ago,
+# with less than a year of history and sold by weight
+EMPTY_SHARE = 0.05
+STALE_SHARE = 0.1
+SHORT_HISTORY_SHARE = 0.2
+WEIGHTED_SHARE = 0.2
+
+
+def get_synthetic_barcodes(count: int) -> List[int]:
+    return [SYNTHETIC_FIRST_BARCODE + i for i in range(count)]
+
+
+def generate_barcode_daily_sales(rng: np.random.Generator, end_day: int, years: int) -> DataFrame:
+    # Poisson sales with yearly seasonality and a weekly pattern; days without sales have no rows
+    kind = rng.random()
+    if kind < EMPTY_SHARE:
+        return create_empty_daily_sales()
+
+    beg_day = end_day - 365 * years + 1
+    if kind < EMPTY_SHARE + STALE_SHARE:
+        end_day -= int(rng.integers(35, 200))
+    elif kind < EMPTY_SHARE + STALE_SHARE + SHORT_HISTORY_SHARE:
+        beg_day = end_day - int(rng.integers(30, 330))
+    days = np.arange(beg_day, end_day + 1)
+
+    level = rng.gamma(2.0, 4.0)
+    season = 1.0 + rng.uniform(0.0, 0.5) * np.sin(2 * np.pi * (days + rng.uniform(0, 365)) / 365.25)
+    weekly = np.clip(1.0 + 0.25 * rng.standard_normal(7), 0.3, None)[days % 7]
+    quantity = rng.poisson(level * season * weekly).astype(float)
+    if rng.random() < WEIGHTED_SHARE:
+        quantity = np.round(quantity * rng.uniform(0.1, 1.5, len(days)), 3)
+    quantity[rng.random(len(days)) < rng.uniform(0.0, 0.4)] = 0.0
+
+    sold = quantity > 0
+    index = pd.DatetimeIndex(days[sold].astype('datetime64[D]'), name=IDX_COL)
+    return DataFrame({'quantity': quantity[sold]}, index=index)
+
+
+def generate_daily_sales(stores: List[int],
+                         codes: List[int],
+                         end_day: int,
+                         years: int,
+                         seed: int = 0
+                         ) -> Dict[Tuple[int, int], DataFrame]:
+    rng = np.random.default_rng(seed)
+    return {(store_id, code): generate_barcode_daily_sales(rng, end_day, years)
+            for store_id in stores
+            for code in codes}
+
+
+def write_sales_cache(cache_dir: str, dfs: Dict[Tuple[int, int], DataFrame], end_day: int):
+    # A cache holding every series and watermarked with the last day never queries the database
+    clear_cache(cache_dir, str(to_datetime64(end_day)))
+    for store_id in sorted({store_id for store_id, _ in dfs}):
+        write_barcodes_daily_sales(cache_dir, store_id, {key: df for key, df in dfs.items() if key[0] == store_id})
@@ -1,66 +1,127 @@
-import arrow
-from arrow import Arrow
+import numpy as np
+import pandas as pd
+from datetime import date
 from pandas import DataFrame, Series
-from pkg.utils.df import create_df_with_zeroes, smooth_df, compare_df, shift_df, increase_df, create_df, \
-    create_df_indexed_by_date
+from pkg.forecast.kernel import get_default_forecasts, get_mean_daily_forecasts, ForecastParams, DEFAULT_PARAMS, \
+    get_category_forecasts as get_kernel_category_forecasts, get_mean_forecasts as get_kernel_mean_forecasts
+from pkg.utils.days import to_datetime64, to_day_ordinal, get_months_back_days
+from pkg.utils.df import create_df_with_zeroes, create_df_from_values, create_date_index, smooth_df, compare_df, \
+    shift_df, increase_df
+from pkg.utils.sales import SalesSeries, create_sales_series
+from pkg.utils.stages import profiled
+from typing import List, Sequence, Tuple, Union
 
+# Dates passed in may be dates, datetimes or Arrow objects, they are turned into day ordinals on entry.
+# params are the ForecastParams of pkg.forecast.kernel
 
-def get_barcode_forecast(data_frame: DataFrame, now: Arrow, for_date: Arrow) -> Series:
-    if not data_frame.empty:
-        last_data_date = arrow.get(data_frame.index.max())
 
-        beg_date = now.shift(months=-1)
-        end_date = for_date
+def get_origin_days(origins: List[date],
+                    days: Union[int, Sequence[int]]
+                    ) -> Tuple[pd.DatetimeIndex, np.ndarray, np.ndarray]:
+    origin_days = np.array([to_day_ordinal(origin) for origin in origins], dtype=np.int64)
+    index = pd.DatetimeIndex(origin_days.astype('datetime64[D]'))
+    return index, origin_days, np.broadcast_to(np.asarray(days, dtype=int), (len(origin_days),))
 
-        real = create_df_with_zeroes(data_frame, beg_date.shift(weeks=-1), end_date)
-        old = create_df_with_zeroes(data_frame, beg_date.shift(weeks=-1), end_date, lambda a: a.shift(years=-1))
-        real_smoothed = smooth_df(real, beg_date, last_data_date)
-        old_smoothed = smooth_df(old, beg_date, end_date)
+
+@profiled('forecast.barcode')
+def get_barcode_forecast(data_frame: Union[DataFrame, SalesSeries],
+                         now: date,
+                         for_date: date,
+                         params: ForecastParams = DEFAULT_PARAMS) -> Series:
+    sales = create_sales_series(data_frame)
+    if not sales.empty:
+        now, end = to_day_ordinal(now), to_day_ordinal(for_date)
+        beg = int(get_months_back_days(now, params.lookback))
+
+        real = create_df_with_zeroes(sales, beg - params.padding, end)
+        old = create_df_with_zeroes(sales, beg - params.padding, end,
+                                    lambda days: get_months_back_days(days, params.lag))
+        real_smoothed = smooth_df(real, beg, sales.last_day, params.window)
+        old_smoothed = smooth_df(old, beg, end, params.window)
 
         if not real_smoothed.empty:
-            _, diff = compare_df(real_smoothed, old_smoothed, now.shift(days=1), end_date)
-            result_forecast = shift_df(old_smoothed, diff, now.shift(days=1), end_date)
-            return result_forecast['quantity'][now.date():for_date.date()]
+            _, diff = compare_df(real_smoothed, old_smoothed, now + 1, end)
+            result_forecast = shift_df(old_smoothed, diff, now + 1, end)
+            return result_forecast['quantity'][to_datetime64(now):to_datetime64(end)]
         else:
             raise Exception('Empty data frame')
     else:
         raise Exception('Empty data frame')
 
 
+def get_barcode_forecasts(data_frame: Union[DataFrame, SalesSeries],
+                          origins: List[date],
+                          days: Union[int, Sequence[int]],
+                          params: ForecastParams = DEFAULT_PARAMS
+                          ) -> Series:
+    # Same algorithm as get_barcode_forecast, summed over `days` days after every origin.
+    # `days` is either one horizon for all origins or a horizon per origin.
+    # Origins where get_barcode_forecast would raise are left as NaN
+    index, origin_days, horizons = get_origin_days(origins, days)
+    series = np.zeros(len(index), dtype=int)
+    forecasts = get_default_forecasts([create_sales_series(data_frame)], series, origin_days, horizons, params)
+    return Series(forecasts, index=index)
+
+
 def get_category_forecast(barcode_data_frame: DataFrame,
                           category_data_frame: DataFrame,
-                          now: Arrow,
-                          for_date: Arrow) -> Series:
-    tomorrow = now.shift(days=1)
-    past_month = now.shift(months=-1)
+                          now: date,
+                          for_date: date,
+                          params: ForecastParams = DEFAULT_PARAMS) -> Series:
+    now, end = to_day_ordinal(now), to_day_ordinal(for_date)
+    tomorrow = now + 1
+    past_month = int(get_months_back_days(now, params.lookback))
 
     barcode_df = create_df_with_zeroes(barcode_data_frame, past_month, now)
-    barcode_smoothed = smooth_df(barcode_df, past_month, now)
-    category_df = create_df_with_zeroes(category_data_frame, past_month, for_date, lambda a: a.shift(years=-1))
-    category_smoothed = smooth_df(category_df, past_month, for_date)
+    barcode_smoothed = smooth_df(barcode_df, past_month, now, params.window)
+    category_df = create_df_with_zeroes(category_data_frame, past_month, end,
+                                        lambda days: get_months_back_days(days, params.lag))
+    category_smoothed = smooth_df(category_df, past_month, end, params.window)
 
-    barcode_series = barcode_smoothed['quantity'][past_month.date():now.date()]
-    category_series = category_smoothed['quantity'][past_month.date():now.date()]
+    barcode_series = barcode_smoothed['quantity'][to_datetime64(past_month):to_datetime64(now)]
+    category_series = category_smoothed['quantity'][to_datetime64(past_month):to_datetime64(now)]
     percent, _ = compare_df(barcode_series.to_frame(), category_series.to_frame(), past_month, now)
-    forecast = category_smoothed['quantity'][tomorrow.date():for_date.date()]
-    forecast_normalized = increase_df(forecast.to_frame(), percent, tomorrow, for_date)
-    return forecast_normalized['quantity'][now.date():for_date.date()]
-
-
-def get_mean_forecast(data_frame: DataFrame, now: Arrow, for_date: Arrow) -> Series:
-    tomorrow = now.shift(days=1)
-    beg = now.shift(days=-6)
-    arr = []
-    for day in Arrow.range('day', beg, now):
-        try:
-            value = data_frame.loc[day.date()].values[0]
-        except KeyError:
-            value = 0.0
-        arr.append([day.date(), value])
-    init_df = create_df_indexed_by_date(create_df(arr))
-    df = create_df_with_zeroes(init_df, beg, for_date)
-    for day in Arrow.range('day', tomorrow, for_date):
-        yesterday = day.shift(days=-1)
-        past_week = df[yesterday.shift(days=-6).date():yesterday.date()]
-        df.loc[day.date()] = past_week.mean()
-    return df['quantity'][tomorrow.date():for_date.date()]
+    forecast = category_smoothed['quantity'][to_datetime64(tomorrow):to_datetime64(end)]
+    forecast_normalized = increase_df(forecast.to_frame(), percent, tomorrow, end)
+    return forecast_normalized['quantity'][to_datetime64(now):to_datetime64(end)]
+
+
+def get_category_forecasts(barcode_data_frame: Union[DataFrame, SalesSeries],
+                           category_data_frame: Union[DataFrame, SalesSeries],
+                           origins: List[date],
+                           days: Union[int, Sequence[int]],
+                           params: ForecastParams = DEFAULT_PARAMS
+                           ) -> Series:
+    # Same algorithm as get_category_forecast, summed over `days` days after every origin.
+    # Origins where get_category_forecast would raise are left as NaN
+    index, origin_days, horizons = get_origin_days(origins, days)
+    series = np.zeros(len(index), dtype=int)
+    forecasts = get_kernel_category_forecasts([create_sales_series(barcode_data_frame)],
+                                              [create_sales_series(category_data_frame)],
+                                              series,
+                                              origin_days,
+                                              horizons,
+                                              params)
+    return Series(forecasts, index=index)
+
+
+def get_mean_forecast(data_frame: Union[DataFrame, SalesSeries],
+                      now: date,
+                      for_date: date,
+                      params: ForecastParams = DEFAULT_PARAMS) -> Series:
+    now, end = to_day_ordinal(now), to_day_ordinal(for_date)
+    forecast = get_mean_daily_forecasts([create_sales_series(data_frame)], [0], [now], max(end - now, 0),
+                                        params.window)[0]
+    return create_df_from_values(create_date_index(now + 1, end), forecast)['quantity']
+
+
+def get_mean_forecasts(data_frame: Union[DataFrame, SalesSeries],
+                       origins: List[date],
+                       days: Union[int, Sequence[int]],
+                       params: ForecastParams = DEFAULT_PARAMS
+                       ) -> Series:
+    # Same algorithm as get_mean_forecast, summed over `days` days after every origin
+    index, origin_days, horizons = get_origin_days(origins, days)
+    series = np.zeros(len(index), dtype=int)
+    forecasts = get_kernel_mean_forecasts([create_sales_series(data_frame)], series, origin_days, horizons, params)
+    return Series(forecasts, index=index)
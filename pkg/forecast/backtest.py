@@ -0,0 +1,133 @@
+import itertools
+import numpy as np
+from pkg.forecast.kernel import get_forecasts, ForecastParams, DEFAULT_PARAMS
+from pkg.utils.sales import SalesSeries, get_sales_sums
+from pkg.utils.series import get_error_sums, get_forecast_metrics, get_metrics_from_sums, \
+    get_percent_accuracy_errors, ERROR_SUMS
+from typing import Dict, Iterable, List, Tuple
+
+# ForecastParams fields that change the forecasts of each algorithm, sweeps keep the others at their defaults.
+# The default algorithm uses lookback only to decide which requests it applies to, and padding only cuts
+# days its comparisons never reach
+SWEPT_PARAMS = {'default': ('window', 'lag'), 'category': ('window', 'lookback', 'lag'), 'mean': ('window',)}
+
+
+def get_rolling_requests(requests: List[Tuple[int, int]], roll: int, step: int) -> List[Tuple[int, int]]:
+    # (origin, days) requests repeated at `roll` origins, each one `step` days before the previous one
+    return [(origin - i * step, days) for i in range(roll) for origin, days in requests]
+
+
+def round_values(values: np.ndarray) -> np.ndarray:
+    # Rounded like the values of the output CSVs, so metrics match tester.py -b on them
+    return np.array([round(value, 2) for value in values.ravel().tolist()]).reshape(values.shape)
+
+
+def get_backtest_values(algorithms: Iterable[str],
+                        sales: List[SalesSeries],
+                        origins: np.ndarray,
+                        horizons: np.ndarray,
+                        category_sales: List[SalesSeries] = None
+                        ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    # Real sales and forecasts of every algorithm for requests j = 0..m-1 of every series i, as n x m matrices.
+    # Real sales of a request are summed from the day after its origin, as tester.py -g does
+    real = get_real_values(sales, origins, horizons)
+    return real, {algorithm: get_forecast_values(algorithm, sales, origins, horizons, category_sales)
+                  for algorithm in algorithms}
+
+
+def get_sweep_values(algorithm: str,
+                     grid: Iterable[ForecastParams],
+                     sales: List[SalesSeries],
+                     origins: np.ndarray,
+                     horizons: np.ndarray,
+                     category_sales: List[SalesSeries] = None
+                     ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    # Same as get_backtest_values for one algorithm under every setting of the grid, keyed by get_setting_name.
+    # Arrays already computed under another setting are reused when they were computed for the same requests
+    # with the same params they depend on, e.g. the coverage index of the series by all the settings. The
+    # default algorithm forecasts the requests of its lag classes, so settings differing in lag rarely share
+    cache = {}
+    real = get_real_values(sales, origins, horizons)
+    return real, {get_setting_name(params): get_forecast_values(algorithm, sales, origins, horizons, category_sales,
+                                                                params, cache)
+                  for params in grid}
+
+
+def get_sweep_grid(algorithm: str, values: Dict[str, List[int]]) -> List[ForecastParams]:
+    # Settings of every combination of the values of the SWEPT_PARAMS of the algorithm
+    values = {name: values[name] if name in SWEPT_PARAMS[algorithm] else [getattr(DEFAULT_PARAMS, name)]
+              for name in ForecastParams._fields}
+    return list(dict.fromkeys(ForecastParams(*setting) for setting in itertools.product(*values.values())))
+
+
+def get_setting_name(params: ForecastParams) -> str:
+    return ' '.join(f'{name}={value}' for name, value in params._asdict().items())
+
+
+def get_real_values(sales: List[SalesSeries], origins: np.ndarray, horizons: np.ndarray) -> np.ndarray:
+    origins, horizons = (np.asarray(a, dtype=np.int64) for a in (origins, horizons))
+    real = np.zeros((len(sales), len(origins)))
+    for i, series in enumerate(sales):
+        if not series.empty:
+            real[i] = get_sales_sums(series, origins + 1, origins + 1 + horizons)
+    return round_values(real)
+
+
+def get_forecast_values(algorithm: str,
+                        sales: List[SalesSeries],
+                        origins: np.ndarray,
+                        horizons: np.ndarray,
+                        category_sales: List[SalesSeries] = None,
+                        params: ForecastParams = DEFAULT_PARAMS,
+                        cache: dict = None
+                        ) -> np.ndarray:
+    origins, horizons = (np.asarray(a, dtype=np.int64) for a in (origins, horizons))
+    series = np.repeat(np.arange(len(sales)), len(origins))
+    values = get_forecasts(algorithm,
+                           sales,
+                           series,
+                           np.tile(origins, len(sales)),
+                           np.tile(horizons, len(sales)),
+                           category_sales if algorithm == 'category' else None,
+                           params,
+                           cache)
+    return round_values(values.reshape(len(sales), len(origins)))
+
+
+def get_series_metrics(real: np.ndarray, forecasts: Dict[str, np.ndarray]) -> List[Dict[str, dict]]:
+    # Metrics of every algorithm for each series of get_backtest_values results
+    return [{algorithm: get_forecast_metrics(real[i], values[i]) for algorithm, values in forecasts.items()}
+            for i in range(len(real))]
+
+
+def create_backtest_report(algorithms: Iterable[str], horizons: np.ndarray):
+    # Returns add(real, forecasts), which takes the get_backtest_values results of a chunk of series,
+    # and report(), which returns the metrics of all the series added so far per algorithm, in total
+    # and per horizon. Chunks are added to error sums per request column and dropped, only the percent
+    # errors of every forecast are kept for the median of accuracy_errors
+    algorithms = list(algorithms)
+    horizons = np.asarray(horizons, dtype=np.int64)
+    sums = {algorithm: np.zeros((len(ERROR_SUMS), len(horizons))) for algorithm in algorithms}
+    errors = {algorithm: [] for algorithm in algorithms}
+
+    def add(real: np.ndarray, chunk_forecasts: Dict[str, np.ndarray]):
+        for algorithm in algorithms:
+            sums[algorithm] += get_error_sums(real, chunk_forecasts[algorithm])
+            errors[algorithm].append(get_percent_accuracy_errors(real, chunk_forecasts[algorithm]))
+
+    def report() -> Dict[str, dict]:
+        result = {}
+        for algorithm in algorithms:
+            if not errors[algorithm]:
+                result[algorithm] = {'total': None, 'days': {}}
+                continue
+            percent_errors = np.concatenate(errors[algorithm])
+            result[algorithm] = {
+                'total': get_metrics_from_sums(sums[algorithm].sum(axis=1), percent_errors.ravel()),
+                'days': {days: get_metrics_from_sums(sums[algorithm][:, horizons == days].sum(axis=1),
+                                                     percent_errors[:, horizons == days].ravel())
+                         for days in np.unique(horizons).tolist()},
+            }
+        return result
+
+    return add, report
@@ -0,0 +1,312 @@
+import hashlib
+import numpy as np
+from pkg.utils.days import get_months_back_days
+from pkg.utils.df import get_moving_average, SMA_WINDOW
+from pkg.utils.sales import SalesSeries, count_sales_days, create_coverage_index, create_sales_matrix
+from pkg.utils.stages import count, profiled
+from typing import Callable, List, NamedTuple
+
+
+class ForecastParams(NamedTuple):
+    # window: days of the moving average. lookback: months before the origin the sales of a series must
+    # reach, and the category algorithm compares them over. padding: days before the lookback day whose
+    # sales feed the moving averages of the default algorithm, older days count as zeroes.
+    # lag: months between a day and the same day of the season before.
+    # Neither lookback nor padding changes the value of a default algorithm forecast, see SWEPT_PARAMS
+    window: int = SMA_WINDOW
+    lookback: int = 1
+    padding: int = SMA_WINDOW
+    lag: int = 12
+
+
+DEFAULT_PARAMS = ForecastParams()
+
+# Classes of default algorithm requests, see classify_requests
+EMPTY_SERIES, NO_YEAR_AGO_SALES, FULL_SERIES = range(3)
+REQUEST_CLASSES = ('empty', 'no_year_ago', 'full')
+
+
+# Every function here forecasts requests i = 0..n-1 of many series at once: request i sums
+# horizons[i] days after the day ordinal origins[i] of the series sales[series[i]].
+# A cache dict shares the arrays that calls with the same sales and other params have in common
+
+def get_cached(cache: dict, key: tuple, requests: tuple, compute: Callable[[], np.ndarray]) -> np.ndarray:
+    # requests are the (series, origins, horizons) arrays the result depends on besides the key
+    if cache is None:
+        return compute()
+    key += (get_requests_key(*requests),)
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
+
+def get_requests_key(*arrays: np.ndarray) -> str:
+    return hashlib.sha1(b''.join(np.ascontiguousarray(a, dtype=np.int64).tobytes() for a in arrays)).hexdigest()
+
+
+def get_sales_windows(sales: List[SalesSeries],
+                      series: np.ndarray,
+                      starts: np.ndarray,
+                      length: int,
+                      lag: int = 0
+                      ) -> np.ndarray:
+    # Row i holds the sales of sales[series[i]] on `length` days from starts[i], or on the days `lag` months before
+    days = starts[:, None] + np.arange(length)
+    if lag:
+        days = get_months_back_days(days, lag)
+    beg_day = int(days.min()) if days.size else 0
+    matrix = create_sales_matrix(sales, beg_day, int(days.max()) if days.size else -1)
+    return matrix[series[:, None], days - beg_day]
+
+
+def get_smoothed_windows(sales: List[SalesSeries],
+                         series: np.ndarray,
+                         starts: np.ndarray,
+                         length: int,
+                         window: int,
+                         lag: int = 0,
+                         cuts: np.ndarray = None
+                         ) -> np.ndarray:
+    # Moving averages of the get_sales_windows rows. Columns before cuts[i] of row i count as zeroes,
+    # without cuts every series is smoothed once over the days of all the requests instead
+    if cuts is not None and cuts.any():
+        values = get_sales_windows(sales, series, starts, length, lag)
+        values[np.arange(length) < cuts[:, None]] = 0.0
+        return get_moving_average(values, window)
+    beg_day = int(starts.min())
+    days = np.arange(beg_day, int(starts.max()) + length)
+    if lag:
+        days = get_months_back_days(days, lag)
+    smoothed = get_moving_average(create_sales_matrix(sales, int(days.min()), int(days.max()))[:, days - days.min()],
+                                  window)
+    return smoothed[series[:, None], (starts - beg_day)[:, None] + np.arange(length - window + 1)]
+
+
+@profiled('forecast.classify')
+def classify_requests(sales: List[SalesSeries],
+                      series: np.ndarray,
+                      origins: np.ndarray,
+                      horizons: np.ndarray,
+                      params: ForecastParams = DEFAULT_PARAMS,
+                      cache: dict = None
+                      ) -> np.ndarray:
+    # Planning stage of the default algorithm, which never applies to the requests of the first two classes:
+    # EMPTY_SERIES when the series has no sales since the lookback day, NO_YEAR_AGO_SALES when no day that
+    # feeds its moving averages had sales a lag ago. It may still not apply to a FULL_SERIES one
+    series, origins, horizons = (np.asarray(a, dtype=np.int64) for a in (series, origins, horizons))
+    index = get_cached(cache, ('coverage',), (), lambda: create_coverage_index(sales))
+    # Shifting months back never reorders days, so these bounds hold all the days a lag ago
+    old_beg_days = get_months_back_days(origins + 2 - params.window, params.lag)
+    old_end_days = get_months_back_days(origins + horizons, params.lag)
+    last_days = (index.first_days + index.lengths - 1)[series]
+
+    classes = np.full(len(origins), FULL_SERIES)
+    classes[(count_sales_days(index, series, old_beg_days, old_end_days) == 0) & (horizons > 0)] = NO_YEAR_AGO_SALES
+    classes[(index.lengths[series] == 0) | (get_months_back_days(origins, params.lookback) > last_days)] = EMPTY_SERIES
+    return classes
+
+
+def get_default_forecasts(sales: List[SalesSeries],
+                          series: np.ndarray,
+                          origins: np.ndarray,
+                          horizons: np.ndarray,
+                          params: ForecastParams = DEFAULT_PARAMS,
+                          cache: dict = None,
+                          last_day_levels: bool = False
+                          ) -> np.ndarray:
+    # Year-over-year shift of the smoothed sales. Requests where the algorithm does not apply
+    # (no sales, no sales since the lookback day, no sales a year ago) are NaN.
+    # Only the FULL_SERIES requests of classify_requests are forecast
+    series, origins, horizons = (np.asarray(a, dtype=np.int64) for a in (series, origins, horizons))
+    forecasts = np.full(len(origins), np.nan)
+    if not len(origins):
+        return forecasts
+
+    classes = classify_requests(sales, series, origins, horizons, params, cache)
+    for request_class, name in enumerate(REQUEST_CLASSES):
+        count(f'forecast.{name}_requests', int((classes == request_class).sum()))
+    rows = np.flatnonzero(classes == FULL_SERIES)
+    if len(rows) == len(origins):
+        return get_full_default_forecasts(sales, series, origins, horizons, params, cache, last_day_levels)
+    if len(rows):
+        forecasts[rows] = get_full_default_forecasts(sales, series[rows], origins[rows], horizons[rows], params, cache,
+                                                     last_day_levels)
+    return forecasts
+
+
+@profiled('forecast.default')
+def get_full_default_forecasts(sales: List[SalesSeries],
+                               series: np.ndarray,
+                               origins: np.ndarray,
+                               horizons: np.ndarray,
+                               params: ForecastParams = DEFAULT_PARAMS,
+                               cache: dict = None,
+                               last_day_levels: bool = False
+                               ) -> np.ndarray:
+    forecasts = np.full(len(origins), np.nan)
+    # Smoothed column 0 of request i is the day after its origin, horizons use a prefix of their row.
+    # Days more than `padding` days before its lookback day are zeroes
+    window = params.window
+    max_days = int(horizons.max())
+    length = max_days + window - 1
+    starts = origins + 2 - window
+    lookback_days = get_months_back_days(origins, params.lookback)
+    cuts = np.clip(lookback_days - params.padding - starts, 0, length)
+    key = (window, cuts.tobytes() if cuts.any() else None)
+    requests = (series, origins, horizons)
+
+    real_smoothed = get_cached(cache, ('default.real',) + key, requests,
+                               lambda: get_smoothed_windows(sales, series, starts, length, window, 0, cuts))
+    old_window = get_cached(cache, ('default.old', params.lag) + key, requests,
+                            lambda: get_smoothed_windows(sales, series, starts, length, window, params.lag, cuts))
+
+    last_days = np.array([s.last_day for s in sales], dtype=np.int64)[series]
+    real_known = (origins + 1)[:, None] + np.arange(max_days) <= last_days[:, None]
+    real_window = np.where(real_known, real_smoothed, 0.0)
+    has_sales = np.array([not s.empty for s in sales], dtype=bool)[series]
+    has_real = has_sales & (lookback_days <= last_days)
+
+    # Without a known day after the origin the levels compare as NaN and the forecast sums to 0.
+    # With last_day_levels they are compared on the last sales day instead, for callers forecasting
+    # from it: its moving average against the one of the same days a lag ago
+    stale = has_real & (last_days <= origins)
+    recent_diff = None
+    if last_day_levels and stale.any():
+        recent_starts = last_days[stale] + 1 - window
+        recent_real = get_smoothed_windows(sales, series[stale], recent_starts, window, window)[:, 0]
+        recent_old = get_smoothed_windows(sales, series[stale], recent_starts, window, window, params.lag)[:, 0]
+        recent_diff = np.zeros(len(origins))
+        recent_diff[stale] = recent_real - recent_old
+
+    for horizon in np.unique(horizons):
+        rows = horizons == horizon
+        with np.errstate(invalid='ignore', divide='ignore'):
+            new_mean = real_window[rows, :horizon].sum(axis=1) / real_known[rows, :horizon].sum(axis=1)
+            old_mean = old_window[rows, :horizon].sum(axis=1) / horizon
+        diff = new_mean - old_mean
+        if recent_diff is not None:
+            diff = np.where(stale[rows], recent_diff[rows], diff)
+        result = np.nansum(old_window[rows, :horizon] + diff[:, None], axis=1)
+
+        applicable = has_real[rows] & (old_mean != 0.0)
+        forecasts[np.flatnonzero(rows)[applicable]] = result[applicable]
+    return forecasts
+
+
+@profiled('forecast.category')
+def get_category_forecasts(sales: List[SalesSeries],
+                           category_sales: List[SalesSeries],
+                           series: np.ndarray,
+                           origins: np.ndarray,
+                           horizons: np.ndarray,
+                           params: ForecastParams = DEFAULT_PARAMS,
+                           cache: dict = None
+                           ) -> np.ndarray:
+    # Smoothed sales of the series category a year ago, scaled by how the series sold against them
+    # since the lookback day. category_sales[i] is the category series of sales[i].
+    # Requests whose category sold nothing during those days a year ago are NaN
+    series, origins, horizons = (np.asarray(a, dtype=np.int64) for a in (series, origins, horizons))
+    forecasts = np.full(len(origins), np.nan)
+    if not len(origins):
+        return forecasts
+
+    # Window of request i starts window - 1 days before its lookback day, which are zeroes for both series
+    window = params.window
+    month_days = get_months_back_days(origins, params.lookback)
+    starts = month_days - (window - 1)
+    length = int((origins + horizons - starts).max()) + 1
+    # Smoothed column 0 is the lookback day
+    cuts = np.full(len(origins), window - 1)
+    key = (window, params.lookback)
+    requests = (series, origins, horizons)
+
+    real_smoothed = get_cached(cache, ('category.real',) + key, requests,
+                               lambda: get_smoothed_windows(sales, series, starts, length, window, 0, cuts))
+    old_smoothed = get_cached(cache, ('category.old', params.lag) + key, requests,
+                              lambda: get_smoothed_windows(category_sales, series, starts, length, window, params.lag,
+                                                           cuts))
+
+    month_lengths = origins - month_days + 1
+    for month_length, horizon in np.unique(np.stack([month_lengths, horizons], axis=1), axis=0).tolist():
+        rows = np.flatnonzero((month_lengths == month_length) & (horizons == horizon))
+        new_mean = real_smoothed[rows, :month_length].mean(axis=1)
+        old_mean = old_smoothed[rows, :month_length].mean(axis=1)
+        values = old_smoothed[rows, month_length:month_length + horizon]
+        # Rows whose category sold nothing a year ago scale by an infinite or NaN percent, they are not applicable
+        with np.errstate(invalid='ignore', divide='ignore'):
+            percent = (new_mean * 100 / old_mean) - 100
+            result = (values + (values * percent[:, None] / 100)).sum(axis=1)
+
+        applicable = old_mean != 0.0
+        forecasts[rows[applicable]] = result[applicable]
+    return forecasts
+
+
+@profiled('forecast.mean')
+def get_mean_daily_forecasts(sales: List[SalesSeries],
+                             series: np.ndarray,
+                             origins: np.ndarray,
+                             days: int,
+                             sma_window: int = SMA_WINDOW
+                             ) -> np.ndarray:
+    # Row i holds `days` daily forecasts after origins[i], every day is the mean of the sma_window days before it
+    series, origins = (np.asarray(a, dtype=np.int64) for a in (series, origins))
+    window = np.zeros((len(origins), sma_window + days))
+    if len(origins):
+        window[:, :sma_window] = get_sales_windows(sales, series, origins + 1 - sma_window, sma_window)
+    for day in range(days):
+        window[:, sma_window + day] = window[:, day:day + sma_window].mean(axis=1)
+    return window[:, sma_window:]
+
+
+def get_mean_forecasts(sales: List[SalesSeries],
+                       series: np.ndarray,
+                       origins: np.ndarray,
+                       horizons: np.ndarray,
+                       params: ForecastParams = DEFAULT_PARAMS,
+                       cache: dict = None
+                       ) -> np.ndarray:
+    horizons = np.asarray(horizons, dtype=np.int64)
+    if not len(horizons):
+        return np.zeros(0)
+
+    def compute():
+        forecasts = np.zeros(len(horizons))
+        daily = get_mean_daily_forecasts(sales, series, origins, int(horizons.max()), params.window)
+        for horizon in np.unique(horizons):
+            rows = horizons == horizon
+            forecasts[rows] = daily[rows, :horizon].sum(axis=1)
+        return forecasts
+
+    return get_cached(cache, ('mean', params.window), (series, origins, horizons), compute).copy()
+
+
+def get_forecasts(algorithm: str,
+                  sales: List[SalesSeries],
+                  series: np.ndarray,
+                  origins: np.ndarray,
+                  horizons: np.ndarray,
+                  category_sales: List[SalesSeries] = None,
+                  params: ForecastParams = DEFAULT_PARAMS,
+                  cache: dict = None,
+                  last_day_levels: bool = False
+                  ) -> np.ndarray:
+    # The default and category algorithms fall back to the mean one for the requests they do not apply to.
+    # With category_sales the default algorithm tries the category one before the mean one.
+    # last_day_levels is for forecasts from the newest sales, see get_full_default_forecasts
+    series, origins, horizons = (np.asarray(a, dtype=np.int64) for a in (series, origins, horizons))
+    forecasts = np.full(len(origins), np.nan)
+    if algorithm == 'default':
+        forecasts = get_default_forecasts(sales, series, origins, horizons, params, cache, last_day_levels)
+    if algorithm == 'category' or (algorithm == 'default' and category_sales is not None):
+        if category_sales is None:
+            raise ValueError('The category algorithm needs category sales')
+        fallback = np.isnan(forecasts)
+        count('forecast.category_fallbacks', int(fallback.sum()) if algorithm == 'default' else 0)
+        forecasts[fallback] = get_category_forecasts(sales, category_sales, series[fallback], origins[fallback],
+                                                     horizons[fallback], params, cache)
+    fallback = np.isnan(forecasts)
+    count('forecast.mean_fallbacks', int(fallback.sum()) if algorithm != 'mean' else 0)
+    forecasts[fallback] = get_mean_forecasts(sales, series[fallback], origins[fallback], horizons[fallback],
+                                             params, cache)
+    return forecasts
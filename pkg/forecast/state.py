@@ -0,0 +1,101 @@
+import numpy as np
+from pkg.data import BULK_CHUNK_SIZE
+from pkg.forecast.kernel import get_forecasts
+from pkg.utils.df import SMA_WINDOW
+from pkg.utils.sales import SalesSeries, get_sales_window
+from typing import Dict, List, NamedTuple, Tuple
+
+# Forecasts made the day after `day` read no sales older than a year before the first smoothing window
+# of the last sales day, which is at most a month before `day` for the series the default algorithm
+# applies to, so that many days of every series are all the state has to keep
+STATE_DAYS = 366 + 31 + SMA_WINDOW
+
+
+class ForecastState(NamedTuple):
+    # Sales of many series as of `day`, the last processed sales day. Row i of values holds the days
+    # day - STATE_DAYS + 1..day of the series keys[i] = (store_id, barcode), and last_days[i] is the
+    # last day the series had a sales row, -1 when it never had one
+    day: int
+    keys: np.ndarray
+    last_days: np.ndarray
+    values: np.ndarray
+
+    @property
+    def beg_day(self) -> int:
+        return self.day - STATE_DAYS + 1
+
+
+def create_forecast_state(sales: Dict[Tuple[int, int], SalesSeries], day: int) -> ForecastState:
+    keys = sorted(sales)
+    values = np.zeros((len(keys), STATE_DAYS))
+    last_days = np.full(len(keys), -1, dtype=np.int64)
+    beg_day = day - STATE_DAYS + 1
+    for i, key in enumerate(keys):
+        series = sales[key]
+        if not series.empty:
+            values[i] = get_sales_window(series, beg_day, day)
+            last_days[i] = min(series.last_day, day)
+    return ForecastState(day, np.array(keys, dtype=np.int64).reshape(-1, 2), last_days, values)
+
+
+def advance_forecast_state(state: ForecastState,
+                           rows: np.ndarray,
+                           days: np.ndarray,
+                           quantity: np.ndarray,
+                           day: int
+                           ) -> ForecastState:
+    # Moves the state to `day` with the sales rows of the days from state.day on: rows[i] is the state row
+    # the sales belong to. Rows of state.day overwrite it, as it may have been read before the day was over.
+    # As in create_sales_series, the first row of a series and day wins
+    rows, days = (np.asarray(a, dtype=np.int64) for a in (rows, days))
+    shift = day - state.day
+    values = np.zeros_like(state.values)
+    if shift < STATE_DAYS:
+        values[:, :STATE_DAYS - shift] = state.values[:, shift:]
+    last_days = state.last_days.copy()
+
+    new = (days >= state.day) & (days <= day)
+    rows, days, quantity = rows[new], days[new], np.asarray(quantity, dtype=float)[new]
+    cells, first_rows = np.unique(rows * STATE_DAYS + (days - (day - STATE_DAYS + 1)), return_index=True)
+    values[cells // STATE_DAYS, cells % STATE_DAYS] = quantity[first_rows]
+    np.maximum.at(last_days, rows, days)
+    return ForecastState(day, state.keys, last_days, values)
+
+
+def get_state_rows(state: ForecastState, store_ids: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    # State rows of (store_id, barcode) pairs, -1 for the series the state does not have
+    positions = {key: i for i, key in enumerate(map(tuple, state.keys.tolist()))}
+    return np.array([positions.get(key, -1) for key in zip(np.asarray(store_ids).tolist(), np.asarray(codes).tolist())],
+                    dtype=np.int64)
+
+
+def get_state_sales(state: ForecastState) -> List[SalesSeries]:
+    # Series ending at their last sales day, empty when that day is older than the state
+    sales = []
+    for values, last_day in zip(state.values, state.last_days.tolist()):
+        if last_day < state.beg_day:
+            sales.append(SalesSeries(0, np.empty(0)))
+        else:
+            sales.append(SalesSeries(state.beg_day, values[:last_day - state.beg_day + 1]))
+    return sales
+
+
+def get_state_forecasts(algorithm: str,
+                        state: ForecastState,
+                        horizons: List[int],
+                        chunk_size: int = BULK_CHUNK_SIZE
+                        ) -> np.ndarray:
+    # Row i holds the forecasts of series i for every horizon, made the day after state.day
+    horizons = np.asarray(horizons, dtype=np.int64)
+    sales = get_state_sales(state)
+    forecasts = np.zeros((len(sales), len(horizons)))
+    for beg in range(0, len(sales), chunk_size):
+        chunk = sales[beg:beg + chunk_size]
+        series = np.repeat(np.arange(len(chunk)), len(horizons))
+        forecasts[beg:beg + len(chunk)] = get_forecasts(algorithm,
+                                                        chunk,
+                                                        series,
+                                                        np.full(len(series), state.day),
+                                                        np.tile(horizons, len(chunk)),
+                                                        last_day_levels=True).reshape(len(chunk), -1)
+    return forecasts
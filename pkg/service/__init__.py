@@ -0,0 +1,149 @@
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pkg.data import create_engine, get_sales_watermark
+from pkg.data.cache import create_sales_loader
+from pkg.data.category import create_category_sales_loader
+from pkg.data.lru import create_lru_loader
+from pkg.forecast.kernel import get_forecasts
+from pkg.utils.sales import SalesSeries
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# A request is (store_id, barcode, origin day ordinal, days)
+DEFAULT_BATCH_WAIT = 0.002
+MAX_BATCH_REQUESTS = 100000
+DEFAULT_RESULT_CACHE_ENTRIES = 1000000
+DEFAULT_WATERMARK_INTERVAL = 60.0
+ENGINE_OPTIONS = {'pool_size': 5, 'max_overflow': 10, 'pool_pre_ping': True, 'pool_recycle': 3600}
+
+
+def forecast_requests(load: Callable[[int, Iterable[int]], Dict[Tuple[int, int], SalesSeries]],
+                      algorithm: str,
+                      requests: List[Tuple[int, int, int, int]],
+                      load_category: Callable[[int, Iterable[int]], Dict[Tuple[int, int], SalesSeries]] = None
+                      ) -> List[float]:
+    # Series are loaded per store and all requests are forecast in one kernel pass.
+    # Orders are forecast from the newest sales, so origins past them compare the levels on the last sales day
+    keys = sorted({(store_id, barcode) for store_id, barcode, _, _ in requests})
+    sales = {}
+    category_sales = {}
+    for store_id, store_keys in itertools.groupby(keys, key=lambda key: key[0]):
+        codes = [barcode for _, barcode in store_keys]
+        sales.update(load(store_id, codes))
+        if algorithm == 'category':
+            category_sales.update(load_category(store_id, codes))
+
+    positions = {key: i for i, key in enumerate(keys)}
+    forecasts = get_forecasts(algorithm,
+                              [sales[key] for key in keys],
+                              [positions[(store_id, barcode)] for store_id, barcode, _, _ in requests],
+                              [origin for _, _, origin, _ in requests],
+                              [days for _, _, _, days in requests],
+                              [category_sales[key] for key in keys] if algorithm == 'category' else None,
+                              last_day_levels=True)
+    return [round(forecast, 2) for forecast in forecasts.tolist()]
+
+
+def create_forecast_service(config: dict,
+                            cache_dir: str = None,
+                            series_cache: int = 0,
+                            result_cache: int = DEFAULT_RESULT_CACHE_ENTRIES,
+                            watermark_interval: float = DEFAULT_WATERMARK_INTERVAL
+                            ) -> Callable[[str, List[Tuple[int, int, int, int]]], List[float]]:
+    # Keeps loaded series and computed forecasts in memory until the database gets a new sales day
+    engine = create_engine(config['mysql'], **ENGINE_OPTIONS)
+    lock = threading.Lock()
+    state = {}
+
+    def reset(watermark, refresh=False):
+        load = create_sales_loader(config['mysql'], cache_dir, refresh, series=True, engine=engine)
+        if series_cache > 0:
+            load = create_lru_loader(load, series_cache)
+        load_category = create_category_sales_loader(config['mysql'], engine=engine)
+        with lock:
+            state.update(watermark=watermark, load=load, load_category=load_category, results=OrderedDict())
+
+    def watch_watermark():
+        while True:
+            time.sleep(watermark_interval)
+            # noinspection PyBroadException
+            try:
+                watermark = get_sales_watermark(engine)
+            except:
+                continue
+            if watermark != state['watermark']:
+                print(f'New sales up to {watermark}, dropping cached series and forecasts')
+                reset(watermark, refresh=True)
+
+    reset(get_sales_watermark(engine))
+    if watermark_interval > 0:
+        threading.Thread(target=watch_watermark, daemon=True).start()
+
+    def forecast(algorithm: str, requests: List[Tuple[int, int, int, int]]) -> List[float]:
+        with lock:
+            load, load_category, results = state['load'], state['load_category'], state['results']
+            keys = [(algorithm,) + tuple(request) for request in requests]
+            forecasts = [results.get(key) for key in keys]
+            # Least recently used forecasts are dropped first
+            for key, forecast in zip(keys, forecasts):
+                if forecast is not None:
+                    results.move_to_end(key)
+        missing = [i for i, forecast in enumerate(forecasts) if forecast is None]
+        if missing:
+            computed = forecast_requests(load, algorithm, [requests[i] for i in missing], load_category)
+            with lock:
+                for i, value in zip(missing, computed):
+                    forecasts[i] = results[keys[i]] = value
+                while len(results) > result_cache:
+                    results.popitem(last=False)
+        return forecasts
+
+    return forecast
+
+
+def create_batcher(forecast: Callable[[str, List[Tuple[int, int, int, int]]], List[float]],
+                   wait: float = DEFAULT_BATCH_WAIT,
+                   max_requests: int = MAX_BATCH_REQUESTS
+                   ) -> Callable[[str, List[Tuple[int, int, int, int]]], Future]:
+    # Requests submitted by concurrent callers within `wait` seconds are forecast together
+    pending = queue.Queue()
+
+    def run():
+        while True:
+            batch = [pending.get()]
+            size = len(batch[0][1])
+            deadline = time.perf_counter() + wait
+            while size < max_requests:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                size += len(batch[-1][1])
+
+            for algorithm in {algorithm for algorithm, _, _ in batch}:
+                items = [item for item in batch if item[0] == algorithm]
+                # noinspection PyBroadException
+                try:
+                    forecasts = forecast(algorithm, [request for _, requests, _ in items for request in requests])
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                bounds = list(itertools.accumulate([0] + [len(requests) for _, requests, _ in items]))
+                for (_, _, future), beg, end in zip(items, bounds, bounds[1:]):
+                    future.set_result(forecasts[beg:end])
+
+    threading.Thread(target=run, daemon=True).start()
+
+    def submit(algorithm: str, requests: List[Tuple[int, int, int, int]]) -> Future:
+        future = Future()
+        pending.put((algorithm, list(requests), future))
+        return future
+
+    return submit
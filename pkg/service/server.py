@@ -0,0 +1,95 @@
+import json
+import os
+import socketserver
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pkg.utils.days import to_day_ordinal
+from typing import Callable, List, Tuple
+
+ALGORITHMS = ('default', 'mean', 'category')
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        request, _ = super().get_request()
+        return request, ('local', 0)
+
+
+def parse_requests(body: dict) -> Tuple[str, List[Tuple[int, int, int, int]]]:
+    # {"algorithm": "default", "requests": [{"store_id": 1, "barcode": 2, "date": "2020-01-31", "days": 7}]}
+    if not isinstance(body, dict):
+        raise ValueError('Body must be a JSON object')
+    algorithm = body.get('algorithm', 'default')
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'Unknown algorithm {algorithm}')
+    if not isinstance(body['requests'], list):
+        raise ValueError('Requests must be a list')
+    requests = []
+    for item in body['requests']:
+        if not isinstance(item, dict):
+            raise ValueError('Every request must be a JSON object')
+        days = int(item['days'])
+        if days < 1:
+            raise ValueError(f'Days must be positive: {days}')
+        origin = to_day_ordinal(date.fromisoformat(item['date']))
+        requests.append((int(item['store_id']), int(item['barcode']), origin, days))
+    return algorithm, requests
+
+
+def create_handler(submit: Callable, timeout: float) -> type:
+    class ForecastHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def send_json(self, status: int, data: dict):
+            content = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self.send_json(200, {'status': 'ok'})
+            else:
+                self.send_json(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            if self.path != '/forecast':
+                self.send_json(404, {'error': 'Not found'})
+                return
+            start = time.perf_counter()
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                if length > MAX_REQUEST_BYTES:
+                    raise ValueError('Request is too large')
+                algorithm, requests = parse_requests(json.loads(self.rfile.read(length)))
+            except (KeyError, TypeError, ValueError) as e:
+                self.send_json(400, {'error': f'Bad request: {e}'})
+                return
+            try:
+                forecasts = submit(algorithm, requests).result(timeout) if requests else []
+            except Exception as e:
+                self.send_json(500, {'error': str(e)})
+                return
+            self.send_json(200, {'forecasts': forecasts, 'ms': round((time.perf_counter() - start) * 1000, 3)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return ForecastHandler
+
+
+def create_server(submit: Callable, host: str = None, port: int = None, socket_path: str = None,
+                  timeout: float = None) -> socketserver.BaseServer:
+    handler = create_handler(submit, timeout)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,71 @@
+import multiprocessing
+import numpy as np
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, List, Tuple
+
+
+def get_peak_rss_mb() -> float:
+    # High-water mark of this process and of its finished worker processes
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_measured(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    # Result and peak RSS of fn run in a forked process. The high-water mark of a fork starts at the current
+    # RSS of this process, not at its own, so every case gets its peak rather than the largest one so far
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+
+    def run():
+        # noinspection PyBroadException
+        try:
+            sender.send((fn(), get_peak_rss_mb(), None))
+        except Exception as e:
+            sender.send((None, None, e))
+
+    process = context.Process(target=run)
+    process.start()
+    sender.close()
+    try:
+        result, peak_rss_mb, error = receiver.recv()
+    except EOFError:
+        result, peak_rss_mb, error = None, None, RuntimeError('Measured process exited without a result')
+    process.join()
+    if error is not None:
+        raise error
+    return result, peak_rss_mb
+
+
+def time_calls(fn: Callable, calls: Iterable[tuple]) -> List[float]:
+    latencies = []
+    for args in calls:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+@contextmanager
+def timer(latencies: List[float]):
+    start = time.perf_counter()
+    yield
+    latencies.append(time.perf_counter() - start)
+
+
+def summarize_latencies(latencies: List[float], forecasts: int, peak_rss_mb: float) -> dict:
+    # Percentiles are per call, throughput counts every forecast made by all the calls
+    seconds = float(np.sum(latencies)) if latencies else 0.0
+    return {
+        'calls': len(latencies),
+        'forecasts': forecasts,
+        'seconds': round(seconds, 6),
+        'forecasts_per_sec': round(forecasts / seconds, 2) if seconds else None,
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 4) if latencies else None,
+        'p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 4) if latencies else None,
+        'peak_rss_mb': round(peak_rss_mb, 2),
+    }
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import time
+from typing import Callable, TextIO, Union
+
+CHECKPOINT_INTERVAL = 60.0
+
+
+def get_checkpoint_file(out_file: str) -> str:
+    return f'{out_file}.checkpoint.json'
+
+
+def get_run_fingerprint(**settings) -> str:
+    # Settings that change the output, a checkpoint is only resumed by the same run
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def read_checkpoint(out_file: str, run: str) -> Union[dict, None]:
+    path = get_checkpoint_file(out_file)
+    if not os.path.exists(path) or not os.path.exists(out_file):
+        return None
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint['run'] != run:
+        raise ValueError(f'{path} was written by a run with other settings')
+    if os.path.getsize(out_file) < checkpoint['size']:
+        raise ValueError(f'{out_file} is shorter than at the checkpoint')
+    return checkpoint
+
+
+def write_checkpoint(out_file: str, run: str, units: int, size: int):
+    path = get_checkpoint_file(out_file)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump({'run': run, 'units': units, 'size': size}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f'{path}.tmp', path)
+
+
+def remove_checkpoint(out_file: str):
+    path = get_checkpoint_file(out_file)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def open_output(out_file: str, checkpoint: Union[dict, None]) -> TextIO:
+    # Rows written after the checkpoint are dropped, they are forecast again
+    if checkpoint is None:
+        return open(out_file, 'w', newline='')
+    os.truncate(out_file, checkpoint['size'])
+    return open(out_file, 'a', newline='')
+
+
+def create_checkpointer(out_file: str,
+                        csv_file: TextIO,
+                        run: str,
+                        units: int = 0,
+                        interval: float = CHECKPOINT_INTERVAL
+                        ) -> Callable[[int], None]:
+    # Called with the number of units whose rows were just written. At most every `interval` seconds the
+    # output is flushed to disk and the number of units it holds is recorded next to it
+    last_time = time.perf_counter()
+
+    def on_written(count: int):
+        nonlocal units, last_time
+        units += count
+        if time.perf_counter() - last_time >= interval:
+            csv_file.flush()
+            os.fsync(csv_file.fileno())
+            write_checkpoint(out_file, run, units, os.fstat(csv_file.fileno()).st_size)
+            last_time = time.perf_counter()
+
+    return on_written
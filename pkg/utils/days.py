@@ -0,0 +1,62 @@
+import numpy as np
+from pandas import DatetimeIndex
+from typing import Union
+
+# Dates are handled as day ordinals: days since 1970-01-01, the integer value of numpy.datetime64[D]
+TABLE_FIRST_DAY = int(np.datetime64('1970-01-01', 'D').astype(np.int64))
+TABLE_LAST_DAY = int(np.datetime64('2099-12-31', 'D').astype(np.int64))
+
+
+def to_day_ordinal(date) -> int:
+    # Accepts dates, datetimes, Arrow objects and pandas timestamps
+    if hasattr(date, 'date'):
+        date = date.date()
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+
+def to_day_ordinals(index: DatetimeIndex) -> np.ndarray:
+    return index.values.astype('datetime64[D]').astype(np.int64)
+
+
+def to_datetime64(day: int) -> np.datetime64:
+    return np.datetime64(int(day), 'D')
+
+
+def shift_months(days: Union[int, np.ndarray], months: int) -> Union[int, np.ndarray]:
+    # Same rules as Arrow.shift(months=...): a day missing in the target month becomes the
+    # last day of that month, e.g. Mar 31 goes back to Feb 28 (or 29) and Feb 29 to Feb 28 a year ago
+    dates = np.asarray(days, dtype=np.int64).astype('datetime64[D]')
+    month_starts = dates.astype('datetime64[M]')
+    day_of_month = dates - month_starts.astype('datetime64[D]')
+    target = month_starts + months
+    month_length = (target + 1).astype('datetime64[D]') - target.astype('datetime64[D]')
+    return (target.astype('datetime64[D]') + np.minimum(day_of_month, month_length - 1)).astype(np.int64)
+
+
+TABLE_DAYS = np.arange(TABLE_FIRST_DAY, TABLE_LAST_DAY + 1)
+MONTH_BACK_TABLE = shift_months(TABLE_DAYS, -1)
+YEAR_BACK_TABLE = shift_months(TABLE_DAYS, -12)
+
+
+def lookup_days(table: np.ndarray, days: Union[int, np.ndarray], months: int) -> Union[int, np.ndarray]:
+    days = np.asarray(days, dtype=np.int64)
+    if days.size and (days.min() < TABLE_FIRST_DAY or days.max() > TABLE_LAST_DAY):
+        return shift_months(days, months)
+    return table[days - TABLE_FIRST_DAY]
+
+
+def get_month_back_days(days: Union[int, np.ndarray]) -> Union[int, np.ndarray]:
+    return lookup_days(MONTH_BACK_TABLE, days, -1)
+
+
+def get_year_back_days(days: Union[int, np.ndarray]) -> Union[int, np.ndarray]:
+    return lookup_days(YEAR_BACK_TABLE, days, -12)
+
+
+def get_months_back_days(days: Union[int, np.ndarray], months: int) -> Union[int, np.ndarray]:
+    # The usual shifts come from the tables, others are computed
+    if months == 1:
+        return get_month_back_days(days)
+    if months == 12:
+        return get_year_back_days(days)
+    return shift_months(days, -months)
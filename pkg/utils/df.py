@@ -1,10 +1,14 @@
 import numpy as np
 import pandas as pd
-from arrow import Arrow
-from pandas import DataFrame
+from numpy.lib.stride_tricks import as_strided
+from pandas import DataFrame, DatetimeIndex, Series
+from pkg.utils.days import to_datetime64, to_day_ordinals
+from pkg.utils.sales import SalesSeries, get_sales_values
+from pkg.utils.stages import profiled
 from typing import List, Callable, Union
 
 IDX_COL = 'date_idx'
+SMA_WINDOW = 7
 
 
 def create_df(arr):
@@ -18,36 +22,61 @@ def create_df_indexed_by_date(data_frame: DataFrame, index_col: str = IDX_COL) -
     return result
 
 
-def create_df_with_zeroes(data_frame: DataFrame,
-                          beg: Arrow,
-                          end: Arrow,
-                          date_selector: Union[Callable, None] = None
+def create_df_from_values(index: DatetimeIndex, values) -> DataFrame:
+    return DataFrame({'quantity': values}, index=index)
+
+
+def create_date_index(beg: int, end: int) -> DatetimeIndex:
+    # Days are day ordinals, see pkg.utils.days
+    return pd.date_range(to_datetime64(beg), to_datetime64(end), freq='D', name=IDX_COL)
+
+
+def get_quantity_series(data_frame: DataFrame) -> Series:
+    series = data_frame.iloc[:, 0]
+    if not series.index.is_unique:
+        series = series[~series.index.duplicated()]
+    return series.astype(float)
+
+
+def get_values_with_zeroes(data_frame: Union[DataFrame, SalesSeries], index: DatetimeIndex) -> np.ndarray:
+    if isinstance(data_frame, SalesSeries):
+        return get_sales_values(data_frame, to_day_ordinals(index))
+    return get_quantity_series(data_frame).reindex(index, fill_value=0.0).to_numpy(dtype=float)
+
+
+def get_moving_average(values: np.ndarray, window: int = SMA_WINDOW) -> np.ndarray:
+    # Simple moving average algorithm along the last axis: item i is the mean of values[..., i:i + window]
+    values = np.ascontiguousarray(values, dtype=float)
+    count = max(values.shape[-1] - window + 1, 0)
+    windows = as_strided(values,
+                         shape=values.shape[:-1] + (count, window),
+                         strides=values.strides + (values.strides[-1],))
+    return windows.mean(axis=-1)
+
+
+@profiled('df.create_with_zeroes')
+def create_df_with_zeroes(data_frame: Union[DataFrame, SalesSeries],
+                          beg: int,
+                          end: int,
+                          day_selector: Union[Callable[[np.ndarray], np.ndarray], None] = None
                           ) -> DataFrame:
-    arr = []
-    for day in Arrow.range('day', beg, end):
-        dt = date_selector(day) if date_selector else day
-        try:
-            value = data_frame.loc[dt.date()].values[0]
-        except KeyError:
-            value = 0.0
-        arr.append([day.date(), value])
-    return create_df_indexed_by_date(create_df(arr))
-
-
-def create_array_with_zeroes(data_frame: DataFrame, beg: Arrow, end: Arrow) -> List[float]:
-    arr = []
-    for day in Arrow.range('day', beg, end):
-        try:
-            value = data_frame.loc[day.date()].values[0]
-        except KeyError:
-            value = 0.0
-        arr.append(value)
-    return arr
-
-
-def compare_df(new_df: DataFrame, old_df: DataFrame, beg: Arrow, end: Arrow):
-    new_mean = new_df.loc[beg.date():end.date()].mean().values[0]
-    old_mean = old_df.loc[beg.date():end.date()].mean().values[0]
+    # day_selector maps an array of days to the days their values are taken from
+    index = create_date_index(beg, end)
+    if day_selector:
+        source_index = pd.DatetimeIndex(day_selector(np.arange(beg, end + 1)).astype('datetime64[D]'))
+    else:
+        source_index = index
+    return create_df_from_values(index, get_values_with_zeroes(data_frame, source_index))
+
+
+def create_array_with_zeroes(data_frame: Union[DataFrame, SalesSeries], beg: int, end: int) -> List[float]:
+    return get_values_with_zeroes(data_frame, create_date_index(beg, end)).tolist()
+
+
+@profiled('df.compare')
+def compare_df(new_df: DataFrame, old_df: DataFrame, beg: int, end: int):
+    new_mean = new_df.loc[to_datetime64(beg):to_datetime64(end)].mean().values[0]
+    old_mean = old_df.loc[to_datetime64(beg):to_datetime64(end)].mean().values[0]
     if old_mean != 0.0:
         percent_diff = (new_mean * 100 / old_mean) - 100
         diff = new_mean - old_mean
@@ -56,33 +85,31 @@ def compare_df(new_df: DataFrame, old_df: DataFrame, beg: Arrow, end: Arrow):
     return percent_diff, diff
 
 
-def modify_df(beg: Arrow, end: Arrow, modifier: Callable):
-    arr = []
-    for day in Arrow.range('day', beg, end):
-        arr.append([day.date(), modifier(day)])
-    return create_df_indexed_by_date(create_df(arr))
+def modify_df(beg: int, end: int, modifier: Callable[[int], float]):
+    index = create_date_index(beg, end)
+    return create_df_from_values(index, [modifier(day) for day in range(beg, end + 1)])
 
 
-def smooth_df(data_frame: DataFrame, beg: Arrow, end: Arrow):
-    def fn(day):
-        # Simple moving average algorithm
-        past_week = create_array_with_zeroes(data_frame, day.shift(days=-6), day)
-        return float(np.mean(past_week))
-    return modify_df(beg, end, fn)
+@profiled('df.smooth')
+def smooth_df(data_frame: DataFrame, beg: int, end: int, window: int = SMA_WINDOW):
+    index = create_date_index(beg, end)
+    if index.empty:
+        return create_df_from_values(index, [])
+    values = get_values_with_zeroes(data_frame, create_date_index(beg - (window - 1), end))
+    return create_df_from_values(index, get_moving_average(values, window))
 
 
-def increase_df(data_frame: DataFrame, inc_percent: float, beg: Arrow, end: Arrow):
-    def fn(day):
-        val = data_frame.loc[day.date()].values[0]
-        return val + (val * inc_percent / 100)
-    return modify_df(beg, end, fn)
+def increase_df(data_frame: DataFrame, inc_percent: float, beg: int, end: int):
+    index = create_date_index(beg, end)
+    values = get_quantity_series(data_frame).loc[index].to_numpy()
+    return create_df_from_values(index, values + (values * inc_percent / 100))
 
 
-def shift_df(data_frame: DataFrame, shift: float, beg: Arrow, end: Arrow):
-    def fn(day):
-        val = data_frame.loc[day.date()].values[0]
-        return val + shift
-    return modify_df(beg, end, fn)
+@profiled('df.shift')
+def shift_df(data_frame: DataFrame, shift: float, beg: int, end: int):
+    index = create_date_index(beg, end)
+    values = get_quantity_series(data_frame).loc[index].to_numpy()
+    return create_df_from_values(index, values + shift)
 
 
 def merge_df(first: DataFrame, second: DataFrame):
@@ -1,3 +1,7 @@
+import csv
+from typing import Callable, Union
+
+
 def read_file_lines(file_name: str):
     f = open(file_name, 'r')
     lines = f.readlines()
@@ -10,3 +14,14 @@ def read_file(file_name: str):
     lines = f.read()
     f.close()
     return lines
+
+
+def iter_csv_rows(file_name: str, delimiter: str = ',', on_read: Union[Callable[[int], None], None] = None):
+    # Streams non-blank rows, reporting the number of bytes read for every line
+    with open(file_name, 'rb') as f:
+        for line in f:
+            if on_read:
+                on_read(len(line))
+            row = next(csv.reader([line.decode()], delimiter=delimiter), None)
+            if row:
+                yield row
@@ -0,0 +1,76 @@
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty
+from typing import Callable, Iterable, Iterator, Union
+
+PROGRESS_POLL_TIMEOUT = 0.1
+PENDING_TASKS_PER_WORKER = 4
+
+_progress: Union[Callable, None] = None
+
+
+def report_progress(*event):
+    if _progress is not None:
+        _progress(*event)
+
+
+def init_worker(queue, initializer: Union[Callable, None], initargs: tuple):
+    global _progress
+
+    def put_progress(*event):
+        queue.put(event)
+
+    _progress = put_progress
+    if initializer:
+        initializer(*initargs)
+
+
+def drain_progress(queue, on_progress: Union[Callable, None], timeout: float = 0.0):
+    while True:
+        try:
+            event = queue.get(timeout=timeout) if timeout else queue.get_nowait()
+        except Empty:
+            return
+        if on_progress:
+            on_progress(*event)
+
+
+def map_ordered(fn: Callable,
+                tasks: Iterable[tuple],
+                workers: int = 1,
+                on_progress: Union[Callable, None] = None,
+                initializer: Union[Callable, None] = None,
+                initargs: tuple = ()
+                ) -> Iterator:
+    # Yields fn(*task) in the order of tasks. Events passed to report_progress by fn
+    # are delivered to on_progress in the calling process as soon as they arrive
+    global _progress
+
+    if workers <= 1:
+        _progress = on_progress
+        if initializer:
+            initializer(*initargs)
+        for task in tasks:
+            yield fn(*task)
+        return
+
+    queue = multiprocessing.Queue()
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=init_worker,
+                             initargs=(queue, initializer, initargs)) as executor:
+        # Tasks are submitted lazily, so only a bounded number of them and their results are held
+        pending = deque()
+        tasks = iter(tasks)
+        while True:
+            for task in itertools.islice(tasks, workers * PENDING_TASKS_PER_WORKER - len(pending)):
+                pending.append(executor.submit(fn, *task))
+            if not pending:
+                break
+            future = pending.popleft()
+            while not future.done():
+                drain_progress(queue, on_progress, PROGRESS_POLL_TIMEOUT)
+            drain_progress(queue, on_progress)
+            yield future.result()
+        drain_progress(queue, on_progress, PROGRESS_POLL_TIMEOUT)
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from pkg.utils.days import to_day_ordinals
+from typing import List, NamedTuple, Union
+
+
+class SalesSeries(NamedTuple):
+    # Daily sales of one series as a dense array addressed by day ordinals (days since
+    # 1970-01-01). values[0] is the sales of first_day, the last item is the last day with data
+    first_day: int
+    values: np.ndarray
+
+    @property
+    def empty(self) -> bool:
+        return len(self.values) == 0
+
+    @property
+    def last_day(self) -> int:
+        return self.first_day + len(self.values) - 1
+
+    @property
+    def last_date(self) -> pd.Timestamp:
+        return pd.Timestamp(np.datetime64(self.last_day, 'D'))
+
+
+def create_sales_series(data: Union[DataFrame, SalesSeries]) -> SalesSeries:
+    if isinstance(data, SalesSeries):
+        return data
+    if data.empty:
+        return SalesSeries(0, np.empty(0, dtype=np.float32))
+
+    return create_sales_series_from_days(to_day_ordinals(data.index), data.iloc[:, 0].to_numpy(dtype=float))
+
+
+def create_sales_series_from_days(days: np.ndarray, quantity: np.ndarray) -> SalesSeries:
+    # Day ordinals and quantities of sales rows, the first row of a day wins
+    if not len(days):
+        return SalesSeries(0, np.empty(0, dtype=np.float32))
+    days, first_rows = np.unique(days, return_index=True)
+    first_day = int(days[0])
+
+    values = np.zeros(int(days[-1]) - first_day + 1)
+    values[days - first_day] = np.asarray(quantity, dtype=float)[first_rows]
+    # Half the memory when no value loses precision, which is the case for piece goods
+    values32 = values.astype(np.float32)
+    return SalesSeries(first_day, values32 if np.array_equal(values32, values) else values)
+
+
+def get_sales_values(sales: SalesSeries, days: np.ndarray) -> np.ndarray:
+    positions = np.asarray(days, dtype=np.int64) - sales.first_day
+    known = (positions >= 0) & (positions < len(sales.values))
+    result = np.zeros(len(positions))
+    result[known] = sales.values[positions[known]]
+    return result
+
+
+def get_sales_window(sales: SalesSeries, beg_day: int, end_day: int) -> np.ndarray:
+    # Contiguous days beg_day..end_day, a slice of the array padded with zeroes outside of it
+    result = np.zeros(max(end_day - beg_day + 1, 0))
+    beg = max(beg_day, sales.first_day)
+    end = min(end_day, sales.last_day)
+    if beg <= end:
+        result[beg - beg_day:end - beg_day + 1] = sales.values[beg - sales.first_day:end - sales.first_day + 1]
+    return result
+
+
+def create_sales_matrix(sales: List[SalesSeries], beg_day: int, end_day: int) -> np.ndarray:
+    # Row i holds days beg_day..end_day of sales[i]
+    matrix = np.zeros((len(sales), max(end_day - beg_day + 1, 0)))
+    for i, series in enumerate(sales):
+        matrix[i] = get_sales_window(series, beg_day, end_day)
+    return matrix
+
+
+def get_sales_sums(sales: SalesSeries, beg_days: np.ndarray, end_days: np.ndarray) -> np.ndarray:
+    # Sales of days beg_days[i]..end_days[i] from one cumulative sum of the series
+    cumsum = np.concatenate([[0.0], np.cumsum(sales.values, dtype=float)])
+    beg = np.clip(np.asarray(beg_days, dtype=np.int64) - sales.first_day, 0, len(sales.values))
+    end = np.clip(np.asarray(end_days, dtype=np.int64) - sales.first_day + 1, 0, len(sales.values))
+    return cumsum[np.maximum(beg, end)] - cumsum[beg]
+
+
+class CoverageIndex(NamedTuple):
+    # Days with sales of many series: the days of series i, lengths[i] of them from first_days[i], are
+    # items offsets[i].. of one array, and counts[k] is the number of its first k items with non-zero sales
+    first_days: np.ndarray
+    lengths: np.ndarray
+    offsets: np.ndarray
+    counts: np.ndarray
+
+
+def create_coverage_index(sales: List[SalesSeries]) -> CoverageIndex:
+    first_days = np.array([series.first_day for series in sales], dtype=np.int64)
+    lengths = np.array([len(series.values) for series in sales], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    has_sales = np.concatenate([series.values for series in sales]) != 0 if sales else np.empty(0, dtype=bool)
+    counts = np.zeros(len(has_sales) + 1, dtype=np.int32)
+    np.cumsum(has_sales, out=counts[1:])
+    return CoverageIndex(first_days, lengths, offsets, counts)
+
+
+def count_sales_days(index: CoverageIndex,
+                     series: np.ndarray,
+                     beg_days: np.ndarray,
+                     end_days: np.ndarray
+                     ) -> np.ndarray:
+    # Days with sales of series series[i] during beg_days[i]..end_days[i]
+    series = np.asarray(series, dtype=np.int64)
+    first_days, lengths, offsets = index.first_days[series], index.lengths[series], index.offsets[series]
+    beg = np.minimum(np.maximum(np.asarray(beg_days, dtype=np.int64) - first_days, 0), lengths)
+    end = np.minimum(np.maximum(np.asarray(end_days, dtype=np.int64) - first_days + 1, beg), lengths)
+    return index.counts[offsets + end] - index.counts[offsets + beg]
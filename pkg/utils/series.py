@@ -1,6 +1,10 @@
+import math
 import numpy as np
 from pandas import Series
 
+# Sums of get_error_sums, in the order of its rows
+ERROR_SUMS = ('count', 'nonzero', 'error', 'squared_error', 'absolute_error', 'absolute_real', 'percent_error')
+
 
 def percent_accuracy_errors(fval: float, sval: float) -> float:
     if fval != 0.0:
@@ -11,6 +15,11 @@ def percent_accuracy_errors(fval: float, sval: float) -> float:
     return perc
 
 
+def format_percent(value) -> str:
+    # Percent metrics are None when they are undefined, e.g. MAPE when nothing sold
+    return 'n/a' if value is None else f'{value}%'
+
+
 def get_series_correlation(first: Series, second: Series):
     return first.corr(second) * 100.0
 
@@ -19,15 +28,72 @@ def is_series_correlated(first: Series, second: Series):
     return get_series_correlation(first, second) >= 75.0
 
 
+def get_percent_accuracy_errors(real: np.ndarray, forecast: np.ndarray) -> np.ndarray:
+    # Vectorized percent_accuracy_errors(real, forecast)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(real != 0.0, np.abs(real - forecast) * 100 / real, forecast)
+
+
+def align_forecast(real: Series, forecast: Series):
+    aligned = real.reindex(forecast.index)
+    if aligned.isna().any():
+        raise KeyError('No real sales for some of the forecasts')
+    return aligned.to_numpy(dtype=float), forecast.to_numpy(dtype=float)
+
+
 def get_forecast_accuracy_errors(real: Series, forecast: Series):
-    arr = []
-    for index, value in forecast.items():
-        arr.append(percent_accuracy_errors(real[index], value))
-    return round(float(np.median(arr)), 2)
+    return round(float(np.median(get_percent_accuracy_errors(*align_forecast(real, forecast)))), 2)
 
 
 def get_forecast_standard_deviation(real: Series, forecast: Series):
-    arr = []
-    for index, value in forecast.items():
-        arr.append(real[index] - value)
-    return round(float(np.std(arr)), 2)
+    real_values, forecast_values = align_forecast(real, forecast)
+    return round(float(np.std(real_values - forecast_values)), 2)
+
+
+def get_forecast_metrics(real: np.ndarray, forecast: np.ndarray) -> dict:
+    # Aligned arrays of real sales and forecasts, percents are of real sales
+    error = forecast - real
+    nonzero = real != 0.0
+    real_total = np.abs(real).sum()
+    mape = np.mean(np.abs(error[nonzero]) / np.abs(real[nonzero])) * 100 if nonzero.any() else None
+    return {
+        'count': int(len(real)),
+        'accuracy_errors': round(float(np.median(get_percent_accuracy_errors(real, forecast))), 2),
+        'standard_deviation': round(float(np.std(real - forecast)), 2),
+        'mape': round(float(mape), 2) if mape is not None else None,
+        'wape': round(float(np.abs(error).sum() / real_total * 100), 2) if real_total else None,
+        'rmse': round(float(np.sqrt(np.mean(error ** 2))), 2),
+        'bias': round(float(np.mean(error)), 2),
+    }
+
+
+def get_error_sums(real: np.ndarray, forecast: np.ndarray) -> np.ndarray:
+    # Column sums of n x m arrays of real sales and forecasts, one row per ERROR_SUMS item.
+    # Sums of many chunks add up to the ones of all their rows
+    error = forecast - real
+    nonzero = real != 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent_error = np.where(nonzero, np.abs(error) / np.abs(real), 0.0)
+    return np.stack([np.full(real.shape[1], float(real.shape[0])),
+                     nonzero.sum(axis=0),
+                     error.sum(axis=0),
+                     (error ** 2).sum(axis=0),
+                     np.abs(error).sum(axis=0),
+                     np.abs(real).sum(axis=0),
+                     percent_error.sum(axis=0)])
+
+
+def get_metrics_from_sums(sums: np.ndarray, percent_accuracy_errors: np.ndarray) -> dict:
+    # get_forecast_metrics of values with these get_error_sums, summed over the columns, and these
+    # get_percent_accuracy_errors. The median of accuracy_errors needs every one of them
+    count, nonzero, error, squared_error, absolute_error, absolute_real, percent_error = sums.tolist()
+    bias = error / count
+    return {
+        'count': int(count),
+        'accuracy_errors': round(float(np.median(percent_accuracy_errors)), 2),
+        'standard_deviation': round(math.sqrt(max(squared_error / count - bias ** 2, 0.0)), 2),
+        'mape': round(percent_error / nonzero * 100, 2) if nonzero else None,
+        'wape': round(absolute_error / absolute_real * 100, 2) if absolute_real else None,
+        'rmse': round(math.sqrt(squared_error / count), 2),
+        'bias': round(bias, 2),
+    }
@@ -0,0 +1,35 @@
+import zlib
+from typing import BinaryIO, Iterable, List, Tuple, Union
+
+# A shard (i, n) is slice i of n disjoint slices of the (store, barcode) series. Series are assigned by
+# a CRC32 of their key, which is the same on every machine and Python version, unlike hash()
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    index, count = (int(part) for part in value.split('/'))
+    if not 0 <= index < count:
+        raise ValueError(f'Shard {value} is not in 0/{count}..{count - 1}/{count}')
+    return index, count
+
+
+def get_shard_index(store_id: int, barcode: int, count: int) -> int:
+    return zlib.crc32(f'{store_id}/{barcode}'.encode()) % count
+
+
+def is_in_shard(shard: Union[Tuple[int, int], None], store_id: int, barcode: int) -> bool:
+    return shard is None or get_shard_index(store_id, barcode, shard[1]) == shard[0]
+
+
+def merge_shard_files(shard_files: List[BinaryIO], units: Iterable[Tuple[int, int, int]], out_file: BinaryIO):
+    # Units are (store, barcode, number of rows) in the order of a serial run. Every shard file holds the rows
+    # of its units in that order, so taking them unit by unit restores the serial output byte for byte
+    for store_id, barcode, rows in units:
+        shard_file = shard_files[get_shard_index(store_id, barcode, len(shard_files))]
+        for _ in range(rows):
+            line = shard_file.readline()
+            if not line:
+                raise ValueError(f'{shard_file.name} has no rows for store {store_id} barcode {barcode}')
+            out_file.write(line)
+    for shard_file in shard_files:
+        if shard_file.readline():
+            raise ValueError(f'{shard_file.name} has rows of series missing in the config or the input')
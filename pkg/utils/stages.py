@@ -0,0 +1,130 @@
+import functools
+import heapq
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Callable
+
+# Per-process stage timers and counters. Everything is a no-op until enable_profiling is called,
+# so hooks can stay in hot paths: a disabled hook costs one flag check
+DEFAULT_SLOWEST_SERIES = 10
+
+_enabled = False
+_slowest_count = DEFAULT_SLOWEST_SERIES
+_seconds = defaultdict(float)
+_calls = defaultdict(int)
+_counters = defaultdict(int)
+_slowest = []
+_no_stage = nullcontext()
+
+
+def enable_profiling(enabled: bool = True, slowest_count: int = DEFAULT_SLOWEST_SERIES):
+    global _enabled, _slowest_count
+    _enabled = enabled
+    _slowest_count = slowest_count
+
+
+def is_profiling() -> bool:
+    return _enabled
+
+
+@contextmanager
+def timed_stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _seconds[name] += time.perf_counter() - start
+        _calls[name] += 1
+
+
+def stage(name: str):
+    return timed_stage(name) if _enabled else _no_stage
+
+
+def profiled(name: str) -> Callable:
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with timed_stage(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def count(name: str, value: int = 1):
+    if _enabled:
+        _counters[name] += value
+
+
+def record_series(key: tuple, seconds: float):
+    # Keeps the slowest series only, ties are broken by the key
+    if _enabled:
+        item = (seconds, key)
+        if len(_slowest) < _slowest_count:
+            heapq.heappush(_slowest, item)
+        elif item > _slowest[0]:
+            heapq.heapreplace(_slowest, item)
+
+
+def take_profile() -> dict:
+    # Returns and resets what this process collected, worker processes send it to the parent
+    profile = {
+        'seconds': dict(_seconds),
+        'calls': dict(_calls),
+        'counters': dict(_counters),
+        'slowest': list(_slowest),
+    }
+    _seconds.clear()
+    _calls.clear()
+    _counters.clear()
+    _slowest.clear()
+    return profile
+
+
+def merge_profile(profile: dict):
+    for name, seconds in profile['seconds'].items():
+        _seconds[name] += seconds
+    for name, calls in profile['calls'].items():
+        _calls[name] += calls
+    for name, value in profile['counters'].items():
+        _counters[name] += value
+    for seconds, key in profile['slowest']:
+        record_series(key, seconds)
+
+
+def get_slowest_series() -> list:
+    return [key for _, key in sorted(_slowest, reverse=True)]
+
+
+def create_profile_report(wall_seconds: float) -> dict:
+    stages = {}
+    for name in sorted(_seconds, key=_seconds.get, reverse=True):
+        stages[name] = {
+            'calls': _calls[name],
+            'seconds': round(_seconds[name], 6),
+            'mean_ms': round(_seconds[name] * 1000 / _calls[name], 4),
+            'share': round(_seconds[name] / wall_seconds, 4) if wall_seconds else None,
+        }
+    return {
+        'wall_seconds': round(wall_seconds, 6),
+        'stages': stages,
+        'counters': dict(sorted(_counters.items())),
+        'slowest_series': [{'key': list(key[:2]), 'seconds': round(seconds, 6)}
+                           for seconds, key in sorted(_slowest, reverse=True)],
+    }
+
+
+def print_profile_report(report: dict):
+    # Stages nest, e.g. df.* run inside forecast.*, so shares don't add up to 100%
+    print(f'\n{"stage":<32}{"calls":>10}{"seconds":>12}{"mean ms":>12}{"share":>9}')
+    for name, item in report['stages'].items():
+        share = f'{item["share"] * 100:.1f}%' if item['share'] is not None else '-'
+        print(f'{name:<32}{item["calls"]:>10}{item["seconds"]:>12.3f}{item["mean_ms"]:>12.3f}{share:>9}')
+    for name, value in report['counters'].items():
+        print(f'{name:<32}{value:>10}')
+    print(f'Wall time: {report["wall_seconds"]:.3f}s')
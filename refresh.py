@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import time
+import yaml
+import sys
+from pkg.arg_parser.refresh import create_argparse
+from pkg.data import create_engine
+from pkg.data.refresh import refresh_daily_sales
+from pkg.utils.console import panic
+from pkg.utils.files import read_file
+
+
+CONFIG = None
+
+
+if __name__ == '__main__':
+    if sys.version_info < (3, 8):
+        panic('We need minimum Python version 3.8 to run. Current version: %s.%s.%s' % sys.version_info[:3])
+
+    args = create_argparse()
+    CONFIG = yaml.safe_load(read_file(args.config))
+    print(f'Config loaded from {args.config}')
+
+    start = time.perf_counter()
+    if args.overlap_days < 0:
+        panic('--overlap-days must not be negative')
+    result = refresh_daily_sales(create_engine(CONFIG['mysql']), args.rebuild, args.overlap_days)
+    if not result['rows']:
+        print(f'Daily sales are up to date as of {result["until"]}')
+    else:
+        print(f'Sales from {result["since"] or "the beginning"} to {result["until"]} were aggregated '
+              f'in {time.perf_counter() - start:.1f}s')
+        for table, rows in result['rows'].items():
+            print(f'{table}: {rows} rows')
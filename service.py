@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+import yaml
+import sys
+from pkg.arg_parser.service import create_argparse
+from pkg.service import create_batcher, create_forecast_service
+from pkg.service.server import create_server
+from pkg.utils.console import panic
+from pkg.utils.files import read_file
+
+
+CONFIG = None
+
+
+if __name__ == '__main__':
+    if sys.version_info < (3, 8):
+        panic('We need minimum Python version 3.8 to run. Current version: %s.%s.%s' % sys.version_info[:3])
+
+    args = create_argparse()
+    CONFIG = yaml.safe_load(read_file(args.config))
+    print(f'Config loaded from {args.config}')
+
+    forecast = create_forecast_service(CONFIG,
+                                       cache_dir=args.cache_dir,
+                                       series_cache=args.series_cache,
+                                       result_cache=args.result_cache,
+                                       watermark_interval=args.watermark_interval)
+    submit = create_batcher(forecast, wait=args.batch_wait_ms / 1000)
+    server = create_server(submit, args.host, args.port, args.socket, args.timeout)
+    print(f'Serving forecasts at {args.socket or f"http://{args.host}:{args.port}"}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,8 @@
+# Incremental refresh (refresh.py): range scans of new sales and upserts into the daily tables
+create index sale__product__sale_time on medivh.sale__product (sale_time, store_id, barcode, quantity);
+create unique index sales__by_barcode_by_day__key on medivh.sales__by_barcode_by_day (store_id, barcode, date);
+create unique index sales__by_category_by_day__key on medivh.sales__by_category_by_day (store_id, category_id, date);
+create index product__barcode on medivh.product (barcode, store_group_id, category_id);
+
+# Sales watermark and the sales days added since a given day
+create index sales__by_barcode_by_day__date on medivh.sales__by_barcode_by_day (date);
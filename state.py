@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import csv
+import os
+import pandas as pd
+import yaml
+import sys
+from pkg.arg_parser.state import create_argparse
+from pkg.data import create_engine, get_daily_sales_since, get_sales_watermark
+from pkg.data.cache import create_sales_loader
+from pkg.data.state import read_forecast_state, write_forecast_state
+from pkg.forecast.state import advance_forecast_state, create_forecast_state, get_state_forecasts, get_state_rows, \
+    STATE_DAYS
+from pkg.utils.console import panic
+from pkg.utils.days import to_datetime64, to_day_ordinal, to_day_ordinals
+from pkg.utils.files import read_file
+
+
+CONFIG = None
+
+
+def init_state(state_file, cache_dir):
+    global CONFIG
+
+    engine = create_engine(CONFIG['mysql'])
+    watermark = get_sales_watermark(engine)
+    if watermark is None:
+        panic('No sales in the database')
+
+    load = create_sales_loader(CONFIG['mysql'], cache_dir, series=True, engine=engine)
+    sales = {}
+    for store_id in CONFIG['stores']:
+        sales.update(load(store_id, CONFIG['barcodes']))
+    state = create_forecast_state(sales, to_day_ordinal(pd.Timestamp(watermark)))
+    write_forecast_state(state_file, state)
+    print(f'State of {len(state.keys)} series as of {watermark} was written to {state_file}')
+
+
+def load_state(state_file):
+    state = read_forecast_state(state_file)
+    if state.values.shape[1] != STATE_DAYS:
+        panic(f'State at {state_file} keeps {state.values.shape[1]} days instead of {STATE_DAYS}. Use --init option')
+    return state
+
+
+def update_state(state_file):
+    global CONFIG
+
+    state = load_state(state_file)
+    engine = create_engine(CONFIG['mysql'])
+    watermark = get_sales_watermark(engine)
+    day = to_day_ordinal(pd.Timestamp(watermark)) if watermark is not None else state.day
+    if day < state.day:
+        print(f'State is up to date as of {to_datetime64(state.day)}')
+        return
+
+    since = str(to_datetime64(state.day))
+    data = get_daily_sales_since(engine, state.keys[:, 0].tolist(), state.keys[:, 1].tolist(), since)
+    rows = get_state_rows(state, data['store_id'].to_numpy(), data['barcode'].to_numpy())
+    known = rows >= 0
+    days = to_day_ordinals(pd.DatetimeIndex(pd.to_datetime(data['date_idx'])))
+    state = advance_forecast_state(state, rows[known], days[known], data['quantity'].to_numpy(dtype=float)[known], day)
+    write_forecast_state(state_file, state)
+    print(f'State advanced from {since} to {watermark} with {int(known.sum())} sales rows, {since} read again')
+
+
+def forecast_state(state_file, out_file, algorithm):
+    global CONFIG
+
+    state = load_state(state_file)
+    horizons = sorted({period['days'] for period in CONFIG['periods']})
+    forecasts = get_state_forecasts(algorithm, state, horizons)
+
+    date = pd.Timestamp(to_datetime64(state.day)).strftime('%d.%m.%Y')
+    with open(out_file, 'w', newline='') as csv_file:
+        csv_writer = csv.writer(csv_file, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        for (store_id, barcode), row in zip(state.keys.tolist(), forecasts.tolist()):
+            csv_writer.writerows([store_id, barcode, date, days, round(forecast, 2)]
+                                 for days, forecast in zip(horizons, row))
+    print(f'Forecasts after {date} were written to {out_file}')
+
+
+if __name__ == '__main__':
+    if sys.version_info < (3, 8):
+        panic('We need minimum Python version 3.8 to run. Current version: %s.%s.%s' % sys.version_info[:3])
+
+    args = create_argparse()
+    CONFIG = yaml.safe_load(read_file(args.config))
+    print(f'Config loaded from {args.config}')
+
+    if args.init:
+        init_state(args.state, args.cache_dir)
+    elif args.update or args.forecast:
+        if not os.path.exists(args.state):
+            panic(f'No state at {args.state}. Use --init option')
+        if args.update:
+            update_state(args.state)
+    else:
+        panic('No command specified. Use --init, -u or -f option')
+
+    if args.forecast:
+        if args.output:
+            forecast_state(args.state, args.output, args.algorithm)
+        else:
+            panic('No output file specified. Use -o option')
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import arrow
+import json
+import numpy as np
+import sys
+import yaml
+from pkg.arg_parser.sweep import create_argparse
+from pkg.data import BULK_CHUNK_SIZE
+from pkg.data.cache import create_sales_loader
+from pkg.data.category import create_category_sales_loader
+from pkg.forecast.backtest import create_backtest_report, get_rolling_requests, get_setting_name, get_sweep_grid, \
+    get_sweep_values, SWEPT_PARAMS
+from pkg.forecast.kernel import ForecastParams, DEFAULT_PARAMS
+from pkg.utils.console import panic
+from pkg.utils.days import to_day_ordinal
+from pkg.utils.files import read_file
+from pkg.utils.pool import map_ordered, report_progress
+from pkg.utils.series import format_percent
+from pkg.utils.shard import is_in_shard
+from progress.bar import ChargingBar
+
+LOAD_SALES = None
+LOAD_CATEGORY_SALES = None
+
+
+def init_worker(config, algorithm, cache_dir, refresh_cache):
+    global LOAD_CATEGORY_SALES, LOAD_SALES
+    LOAD_SALES = create_sales_loader(config['mysql'], cache_dir, refresh_cache, series=True)
+    LOAD_CATEGORY_SALES = create_category_sales_loader(config['mysql']) if algorithm == 'category' else None
+
+
+def sweep_barcodes(store_id, barcodes, algorithm, grid, origins, horizons):
+    # Every series is loaded once and forecast under all the settings
+    sales = LOAD_SALES(store_id, barcodes)
+    category_sales = None
+    if LOAD_CATEGORY_SALES:
+        categories = LOAD_CATEGORY_SALES(store_id, barcodes)
+        category_sales = [categories[(store_id, barcode)] for barcode in barcodes]
+    result = get_sweep_values(algorithm,
+                              grid,
+                              [sales[(store_id, barcode)] for barcode in barcodes],
+                              origins,
+                              horizons,
+                              category_sales)
+    for barcode in barcodes:
+        report_progress(store_id, barcode, len(origins))
+    return result
+
+
+if __name__ == '__main__':
+    if sys.version_info < (3, 8):
+        panic('We need minimum Python version 3.8 to run. Current version: %s.%s.%s' % sys.version_info[:3])
+
+    args = create_argparse()
+    if args.roll < 1 or args.step < 1:
+        panic('--roll and --step must be positive')
+    if min(args.window) < 1 or min(args.lag) < 1 or min(args.lookback + args.padding) < 0:
+        panic('--window and --lag must be positive, --lookback and --padding must not be negative')
+
+    config = yaml.safe_load(read_file(args.config))
+    print(f'Config loaded from {args.config}')
+
+    values = {name: getattr(args, name) for name in ForecastParams._fields}
+    ignored = [name for name, param_values in values.items()
+               if name not in SWEPT_PARAMS[args.algorithm] and param_values != [getattr(DEFAULT_PARAMS, name)]]
+    if ignored:
+        print(f'{", ".join("--" + name for name in ignored)} {"does" if len(ignored) == 1 else "do"} not change '
+              f'{args.algorithm} forecasts, only the default values are used')
+    grid = get_sweep_grid(args.algorithm, values)
+    requests = get_rolling_requests([(to_day_ordinal(arrow.get(period['date'], 'DD.MM.YYYY').date()), period['days'])
+                                     for period in config['periods']], args.roll, args.step)
+    origins = np.array([origin for origin, _ in requests], dtype=np.int64)
+    horizons = np.array([days for _, days in requests], dtype=np.int64)
+    store_barcodes = [(store_id, [barcode for barcode in config['barcodes']
+                                  if is_in_shard(args.shard, store_id, barcode)])
+                      for store_id in config['stores']]
+
+    print(f'Sweeping {len(grid)} settings of the {args.algorithm} algorithm '
+          f'on {len(requests)} origins of every series...')
+    bar = ChargingBar('Waiting...', max=sum(len(codes) for _, codes in store_barcodes) * len(requests))
+    bar.start()
+
+    def on_progress(store_id, barcode, count):
+        bar.message = f'[Store: {store_id}] {str(barcode).ljust(13, " ")}'
+        bar.next(count)
+
+    names = [get_setting_name(params) for params in grid]
+    add, report = create_backtest_report(names, horizons)
+    tasks = ((store_id, codes[i:i + BULK_CHUNK_SIZE], args.algorithm, grid, origins, horizons)
+             for store_id, codes in store_barcodes
+             for i in range(0, len(codes), BULK_CHUNK_SIZE))
+    for real, forecasts in map_ordered(sweep_barcodes,
+                                       tasks,
+                                       args.workers,
+                                       on_progress,
+                                       initializer=init_worker,
+                                       initargs=(config, args.algorithm, args.cache_dir, args.refresh_cache)):
+        add(real, forecasts)
+
+    bar.finish()
+    print()
+
+    result = report()
+    for name, metrics in result.items():
+        total = metrics['total']
+        if total is not None:
+            print(f'{name}: accuracy errors {total["accuracy_errors"]}%, MAPE {format_percent(total["mape"])}, '
+                  f'WAPE {format_percent(total["wape"])}, RMSE {total["rmse"]}, bias {total["bias"]}')
+    ranked = [name for name in names if result[name]['total'] and result[name]['total']['wape'] is not None]
+    if ranked:
+        print(f'\nBest WAPE: {min(ranked, key=lambda name: result[name]["total"]["wape"])}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'algorithm': args.algorithm,
+                       'roll': args.roll,
+                       'step': args.step,
+                       'settings': [dict(params._asdict(), **result[name]) for params, name in zip(grid, names)]},
+                      f, indent=2)
+        print(f'Report was written to {args.output}')
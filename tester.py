@@ -3,16 +3,78 @@
 import arrow
 import csv
 import pandas as pd
-import matplotlib.pyplot as plt
+import numpy as np
 import sys
 import yaml
 from pkg.arg_parser.tester import create_argparse
-from pkg.data import get_barcode_daily_sales, create_engine
+from pkg.data import BULK_CHUNK_SIZE
+from pkg.data.cache import create_sales_loader
 from pkg.utils.console import panic
+from pkg.utils.days import to_day_ordinal
 from pkg.utils.files import read_file
-from pkg.utils.series import get_forecast_accuracy_errors, get_forecast_standard_deviation
+from pkg.utils.pool import map_ordered, report_progress
+from pkg.utils.sales import get_sales_sums
+from pkg.utils.series import format_percent, get_forecast_metrics
+from pkg.utils.shard import is_in_shard
 from progress.bar import ChargingBar
 
+INDEX_COLUMNS = ['store_id', 'barcode', 'date', 'days']
+MAX_LISTED_KEYS = 10
+LOAD_SALES = None
+
+
+def init_generator(config, cache_dir, refresh_cache):
+    global LOAD_SALES
+    LOAD_SALES = create_sales_loader(config['mysql'], cache_dir, refresh_cache, series=True)
+
+
+def get_period_days(periods):
+    # Real sales of a period are summed from the day after its date through `days` days after that
+    beg_days = np.array([to_day_ordinal(arrow.get(period['date'], 'DD.MM.YYYY')) + 1 for period in periods])
+    return beg_days, beg_days + np.array([period['days'] for period in periods], dtype=np.int64)
+
+
+def generate_sales_rows(store_id, barcodes, periods, beg_days, end_days):
+    sales = LOAD_SALES(store_id, barcodes)
+    rows = []
+    for barcode in barcodes:
+        series = sales[(store_id, barcode)]
+        # Series without any sales are written as 0, like the sum of an empty frame was
+        sums = get_sales_sums(series, beg_days, end_days).tolist() if not series.empty else [0] * len(periods)
+        rows.extend([store_id, barcode, period['date'], period['days'], round(sales_sum, 2)]
+                    for period, sales_sum in zip(periods, sums))
+        report_progress(store_id, barcode, len(periods))
+    return rows
+
+
+def read_forecasts(csv_file, name):
+    df = pd.read_csv(csv_file, sep=' ', names=INDEX_COLUMNS + [name], index_col=INDEX_COLUMNS)
+    return df[name].sort_index()
+
+
+def get_dropped_forecasts_line(series_forecast, compared_index):
+    # Forecasts without real sales are left out of the metrics, the first keys are listed
+    dropped = series_forecast.index.difference(compared_index)
+    if not len(dropped):
+        return None
+    keys = ', '.join(' '.join(map(str, key)) for key in dropped[:MAX_LISTED_KEYS])
+    more = f' and {len(dropped) - MAX_LISTED_KEYS} more' if len(dropped) > MAX_LISTED_KEYS else ''
+    return f'... warning: {len(dropped)} forecasts have no real sales and were not compared: {keys}{more}'
+
+
+def show_plot(df, image):
+    # matplotlib is only imported when a plot is drawn
+    import matplotlib.pyplot as plt
+
+    plot = df.plot()
+    plot.set_xticklabels([])
+    if image:
+        print('Saving plot...')
+        fig = plot.get_figure()
+        fig.savefig(image, dpi=512)
+        print(f'Plot saved to {image}')
+    plt.show()
+
 
 if __name__ == '__main__':
     if sys.version_info < (3, 8):
@@ -28,43 +90,32 @@ if __name__ == '__main__':
                 config = yaml.safe_load(read_file(args.config))
                 print(f'Config loaded from {args.config}')
 
-                engine = create_engine(config['mysql'])
-
                 print(f'Processing...')
                 stores = config['stores']
                 barcodes = config['barcodes']
                 periods = config['periods']
-                iter_cnt = len(stores) * len(barcodes) * len(periods)
+                store_barcodes = [(store_id, [barcode for barcode in barcodes
+                                              if is_in_shard(args.shard, store_id, barcode)])
+                                  for store_id in stores]
+                iter_cnt = sum(len(codes) for _, codes in store_barcodes) * len(periods)
                 bar = ChargingBar('Waiting...', max=iter_cnt)
                 bar.start()
 
-                for s in range(len(stores)):
-                    store_id = stores[s]
-
-                    for b in range(len(barcodes)):
-                        barcode = barcodes[b]
-                        bar.message = f'[Store: {store_id}] {str(barcode).ljust(13, " ")}'
-                        bar.update()
-
-                        df_barcode = get_barcode_daily_sales(engine, store_id, barcode)
-
-                        for plot in range(len(periods)):
-                            period = periods[plot]
-                            today = arrow.get(period['date'], 'DD.MM.YYYY')
-                            beg = today.shift(days=1)
-                            end = beg.shift(days=period['days'])
-
-                            sales = df_barcode.loc[beg.date():end.date()]
-                            sales_sum = sales['quantity'].sum()
-
-                            csv_writer.writerow([
-                                store_id,
-                                barcode,
-                                period['date'],
-                                period['days'],
-                                round(sales_sum, 2)
-                            ])
-                            bar.next()
+                def on_progress(store_id, barcode, count):
+                    bar.message = f'[Store: {store_id}] {str(barcode).ljust(13, " ")}'
+                    bar.next(count)
+
+                beg_days, end_days = get_period_days(periods)
+                tasks = ((store_id, codes[i:i + BULK_CHUNK_SIZE], periods, beg_days, end_days)
+                         for store_id, codes in store_barcodes
+                         for i in range(0, len(codes), BULK_CHUNK_SIZE))
+                for rows in map_ordered(generate_sales_rows,
+                                        tasks,
+                                        args.workers,
+                                        on_progress,
+                                        initializer=init_generator,
+                                        initargs=(config, args.cache_dir, args.refresh_cache)):
+                    csv_writer.writerows(rows)
 
                 bar.finish()
                 csv_file.close()
@@ -79,46 +130,32 @@ if __name__ == '__main__':
     elif args.benchmark:
         if args.sales:
             if args.forecasts:
-                index_columns = ['store_id', 'barcode', 'date', 'days']
-                columns = index_columns[:]
-                columns.append('real-sales')
-
-                df_main = pd.read_csv(
-                    args.sales,
-                    sep=' ',
-                    names=columns,
-                    index_col=index_columns
-                )
-                series_main = df_main['real-sales'].sort_index()
-
-                for csv_file in args.forecasts:
-                    columns = index_columns[:]
-                    columns.append(csv_file)
-
-                    df = pd.read_csv(
-                        csv_file,
-                        sep=' ',
-                        names=columns,
-                        index_col=index_columns
-                    )
-                    series_forecast = df[csv_file].sort_index()
-                    accuracy_errors = get_forecast_accuracy_errors(series_main, series_forecast)
-                    standard_deviation = get_forecast_standard_deviation(series_main, series_forecast)
+                series_main = read_forecasts(args.sales, 'real-sales')
+                forecasts = [read_forecasts(csv_file, csv_file) for csv_file in args.forecasts]
+
+                # Sales and all forecasts are aligned once, metrics of every file are computed on arrays
+                df_main = series_main.to_frame().join([series.to_frame() for series in forecasts])
+                real = df_main['real-sales'].to_numpy(dtype=float)
+                for csv_file, series_forecast in zip(args.forecasts, forecasts):
+                    forecast = df_main[csv_file].to_numpy(dtype=float)
+                    known = ~np.isnan(forecast) & ~np.isnan(real)
+                    metrics = get_forecast_metrics(real[known], forecast[known])
 
                     print(f'{csv_file}:')
-                    print(f'... accuracy errors: {accuracy_errors}%')
-                    print(f'... standard deviation: {standard_deviation}\n')
-
-                    df_main = df_main.join(df)
-
-                plot = df_main.plot()
-                plot.set_xticklabels([])
-                if args.image:
-                    print('Saving plot...')
-                    fig = plot.get_figure()
-                    fig.savefig(args.image, dpi=512)
-                    print(f'Plot saved to {args.image}')
-                plt.show()
+                    print(f'... accuracy errors: {metrics["accuracy_errors"]}%')
+                    print(f'... standard deviation: {metrics["standard_deviation"]}')
+                    print(f'... MAPE: {format_percent(metrics["mape"])}')
+                    print(f'... WAPE: {format_percent(metrics["wape"])}')
+                    print(f'... RMSE: {metrics["rmse"]}')
+                    print(f'... bias: {metrics["bias"]}')
+                    print(f'... compared forecasts: {metrics["count"]} of {len(series_forecast)}')
+                    dropped_line = get_dropped_forecasts_line(series_forecast, df_main.index[known])
+                    if dropped_line:
+                        print(dropped_line)
+                    print()
+
+                if not args.headless:
+                    show_plot(df_main, args.image)
 
             else:
                 panic('No files with forecasts specified. Use -f option')
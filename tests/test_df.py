@@ -0,0 +1,234 @@
+import arrow
+import numpy as np
+import pandas as pd
+import pytest
+from arrow import Arrow
+from medivh import do_forecast
+from pandas import DataFrame
+from pkg.utils.days import to_day_ordinal
+from pkg.utils.df import create_df, create_df_indexed_by_date, create_df_with_zeroes, create_array_with_zeroes, \
+    compare_df, shift_df, smooth_df
+
+# Reference implementations: the per-day loops the array helpers replaced. Days are looked up as
+# timestamps, which newer pandas versions need on a DatetimeIndex, the rest is kept as it was
+
+
+def ref_create_df_with_zeroes(data_frame, beg, end, date_selector=None):
+    arr = []
+    for day in Arrow.range('day', beg, end):
+        dt = date_selector(day) if date_selector else day
+        try:
+            value = data_frame.loc[pd.Timestamp(dt.date())].values[0]
+        except KeyError:
+            value = 0.0
+        arr.append([day.date(), value])
+    return create_df_indexed_by_date(create_df(arr))
+
+
+def ref_create_array_with_zeroes(data_frame, beg, end):
+    arr = []
+    for day in Arrow.range('day', beg, end):
+        try:
+            value = data_frame.loc[pd.Timestamp(day.date())].values[0]
+        except KeyError:
+            value = 0.0
+        arr.append(value)
+    return arr
+
+
+def ref_compare_df(new_df, old_df, beg, end):
+    new_mean = new_df.loc[beg.date():end.date()].mean().values[0]
+    old_mean = old_df.loc[beg.date():end.date()].mean().values[0]
+    if old_mean != 0.0:
+        percent_diff = (new_mean * 100 / old_mean) - 100
+        diff = new_mean - old_mean
+    else:
+        raise Exception('No data for past year')
+    return percent_diff, diff
+
+
+def ref_modify_df(beg, end, modifier):
+    arr = []
+    for day in Arrow.range('day', beg, end):
+        arr.append([day.date(), modifier(day)])
+    return create_df_indexed_by_date(create_df(arr))
+
+
+def ref_smooth_df(data_frame, beg, end):
+    def fn(day):
+        past_week = ref_create_array_with_zeroes(data_frame, day.shift(days=-6), day)
+        return float(np.mean(past_week))
+    return ref_modify_df(beg, end, fn)
+
+
+def ref_shift_df(data_frame, shift, beg, end):
+    def fn(day):
+        val = data_frame.loc[pd.Timestamp(day.date())].values[0]
+        return val + shift
+    return ref_modify_df(beg, end, fn)
+
+
+def ref_get_barcode_forecast(data_frame, now, for_date):
+    if not data_frame.empty:
+        last_data_date = arrow.get(data_frame.index.max())
+
+        beg_date = now.shift(months=-1)
+        end_date = for_date
+
+        real = ref_create_df_with_zeroes(data_frame, beg_date.shift(weeks=-1), end_date)
+        old = ref_create_df_with_zeroes(data_frame, beg_date.shift(weeks=-1), end_date, lambda a: a.shift(years=-1))
+        real_smoothed = ref_smooth_df(real, beg_date, last_data_date)
+        old_smoothed = ref_smooth_df(old, beg_date, end_date)
+
+        if not real_smoothed.empty:
+            _, diff = ref_compare_df(real_smoothed, old_smoothed, now.shift(days=1), end_date)
+            result_forecast = ref_shift_df(old_smoothed, diff, now.shift(days=1), end_date)
+            return result_forecast['quantity'][now.date():for_date.date()]
+        else:
+            raise Exception('Empty data frame')
+    else:
+        raise Exception('Empty data frame')
+
+
+def ref_get_mean_forecast(data_frame, now, for_date):
+    tomorrow = now.shift(days=1)
+    beg = now.shift(days=-6)
+    arr = []
+    for day in Arrow.range('day', beg, now):
+        try:
+            value = data_frame.loc[pd.Timestamp(day.date())].values[0]
+        except KeyError:
+            value = 0.0
+        arr.append([day.date(), value])
+    init_df = create_df_indexed_by_date(create_df(arr))
+    df = ref_create_df_with_zeroes(init_df, beg, for_date)
+    for day in Arrow.range('day', tomorrow, for_date):
+        yesterday = day.shift(days=-1)
+        past_week = df[yesterday.shift(days=-6).date():yesterday.date()]
+        df.loc[pd.Timestamp(day.date())] = past_week.mean()
+    return df['quantity'][tomorrow.date():for_date.date()]
+
+
+def ref_do_forecast(algorithm, data_frame, now, for_date):
+    forecast = 0.0
+    if algorithm == 'default':
+        use_mean_forecast = False
+        # noinspection PyBroadException
+        try:
+            forecast = ref_get_barcode_forecast(data_frame, now, for_date).sum()
+        except:
+            use_mean_forecast = True
+        if use_mean_forecast:
+            forecast = ref_get_mean_forecast(data_frame, now, for_date).sum()
+    elif algorithm == 'mean':
+        forecast = ref_get_mean_forecast(data_frame, now, for_date).sum()
+    return round(forecast, 2)
+
+
+def create_sales_df(days, quantities) -> DataFrame:
+    return create_df_indexed_by_date(create_df([[day.date(), quantity] for day, quantity in zip(days, quantities)]))
+
+
+def create_gapped_series(seed: int, weighted: bool) -> DataFrame:
+    # Two years of sales with gaps of a day and of weeks, weighted goods sell fractions of a kilo
+    rng = np.random.default_rng(seed)
+    days = [day for day in Arrow.range('day', arrow.get('2018-11-01'), arrow.get('2020-05-31'))
+            if rng.random() < 0.7 and not arrow.get('2019-07-01') <= day <= arrow.get('2019-07-20')]
+    quantities = rng.gamma(2.0, 0.35, len(days)).round(3) if weighted else rng.integers(1, 12, len(days))
+    return create_sales_df(days, quantities.tolist())
+
+
+SERIES = {
+    'pieces': create_gapped_series(1, False),
+    'weighted': create_gapped_series(2, True),
+    'no_year_ago': create_sales_df(list(Arrow.range('day', arrow.get('2020-01-10'), arrow.get('2020-03-20'))),
+                                   [float(i % 5) for i in range(71)]),
+    'empty': create_sales_df([], []),
+}
+# The leap day goes back a month to Jan 29 and a year to Feb 28. The gapped series sell until May 31,
+# the last origins have no sales day after them
+ORIGINS = ['2019-12-31', '2020-02-29', '2020-03-31', '2020-05-10', '2020-05-24', '2020-05-31', '2020-06-05']
+
+
+def assert_frames_equal(new: DataFrame, old: DataFrame):
+    assert np.array_equal(new.index.values.astype('datetime64[D]'), old.index.values.astype('datetime64[D]'))
+    assert np.array_equal(new['quantity'].to_numpy(dtype=float), old['quantity'].to_numpy(dtype=float))
+
+
+@pytest.mark.parametrize('name', ['pieces', 'weighted'])
+@pytest.mark.parametrize('origin', ORIGINS)
+def test_create_df_with_zeroes(name, origin):
+    df = SERIES[name]
+    beg, end = arrow.get(origin).shift(weeks=-6), arrow.get(origin).shift(days=14)
+    assert_frames_equal(create_df_with_zeroes(df, to_day_ordinal(beg), to_day_ordinal(end)),
+                        ref_create_df_with_zeroes(df, beg, end))
+    old = create_df_with_zeroes(df, to_day_ordinal(beg), to_day_ordinal(end),
+                                lambda days: np.array([to_day_ordinal(arrow.get(str(np.datetime64(int(day), 'D')))
+                                                                      .shift(years=-1)) for day in days]))
+    assert_frames_equal(old, ref_create_df_with_zeroes(df, beg, end, lambda a: a.shift(years=-1)))
+    assert create_array_with_zeroes(df, to_day_ordinal(beg), to_day_ordinal(end)) == \
+        ref_create_array_with_zeroes(df, beg, end)
+
+
+@pytest.mark.parametrize('name', ['pieces', 'weighted'])
+@pytest.mark.parametrize('origin', ORIGINS)
+def test_smooth_shift_compare(name, origin):
+    now = arrow.get(origin)
+    beg, end = now.shift(months=-1), now.shift(days=30)
+    df = ref_create_df_with_zeroes(SERIES[name], beg.shift(weeks=-1), end)
+    smoothed = smooth_df(df, to_day_ordinal(beg), to_day_ordinal(end))
+    ref_smoothed = ref_smooth_df(df, beg, end)
+    assert_frames_equal(smoothed, ref_smoothed)
+
+    old = ref_smooth_df(ref_create_df_with_zeroes(SERIES[name], beg.shift(weeks=-1), end, lambda a: a.shift(years=-1)),
+                        beg, end)
+    tomorrow = now.shift(days=1)
+    percent, diff = compare_df(smoothed, old, to_day_ordinal(tomorrow), to_day_ordinal(end))
+    assert (percent, diff) == ref_compare_df(ref_smoothed, old, tomorrow, end)
+    assert_frames_equal(shift_df(old, diff, to_day_ordinal(tomorrow), to_day_ordinal(end)),
+                        ref_shift_df(old, diff, tomorrow, end))
+
+
+def test_smooth_empty_window():
+    df = SERIES['pieces']
+    beg, end = arrow.get('2020-03-10'), arrow.get('2020-03-09')
+    assert smooth_df(df, to_day_ordinal(beg), to_day_ordinal(end)).empty
+    assert ref_smooth_df(df, beg, end).empty
+
+
+def test_compare_without_past_year():
+    df = SERIES['no_year_ago']
+    beg, end = arrow.get('2020-02-01'), arrow.get('2020-02-20')
+    old = ref_create_df_with_zeroes(df, beg, end, lambda a: a.shift(years=-1))
+    with pytest.raises(Exception):
+        ref_compare_df(df, old, beg, end)
+    with pytest.raises(Exception):
+        compare_df(df, old, to_day_ordinal(beg), to_day_ordinal(end))
+
+
+@pytest.mark.parametrize('algorithm', ['default', 'mean'])
+@pytest.mark.parametrize('name', list(SERIES))
+@pytest.mark.parametrize('origin', ORIGINS)
+@pytest.mark.parametrize('days', [1, 7, 30])
+def test_do_forecast(algorithm, name, origin, days):
+    df = SERIES[name]
+    now = arrow.get(origin)
+    for_date = now.shift(days=days)
+    expected = ref_do_forecast(algorithm, df, now, for_date)
+    assert do_forecast(algorithm, df, now, for_date) == expected
+
+
+# Weighted periods where summing the kernel windows rounds to another cent than the pandas frames
+@pytest.mark.parametrize('origin, days', [('2019-12-19', 14), ('2019-12-23', 5), ('2020-02-07', 30),
+                                          ('2020-04-16', 14)])
+def test_do_forecast_weighted_rounding(origin, days):
+    now = arrow.get(origin)
+    for_date = now.shift(days=days)
+    assert do_forecast('default', SERIES['weighted'], now, for_date) == \
+        ref_do_forecast('default', SERIES['weighted'], now, for_date)
+
+
+def test_frames_keep_dates():
+    df = create_df_with_zeroes(SERIES['pieces'], to_day_ordinal(arrow.get('2020-02-27')),
+                               to_day_ordinal(arrow.get('2020-03-02')))
+    assert list(df.index) == list(pd.date_range('2020-02-27', '2020-03-02', freq='D'))
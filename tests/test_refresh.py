@@ -0,0 +1,143 @@
+import pytest
+import sqlalchemy
+from pkg.data.refresh import read_refresh_watermark, refresh_daily_sales
+from sqlalchemy import event, text
+
+SCHEMA = '''
+create table medivh.sale__product (store_id int, barcode bigint, sale_time datetime, quantity double);
+create table medivh.store (id int, store_group_id int);
+create table medivh.product (barcode bigint, store_group_id int, category_id int);
+create table medivh.sales__by_barcode_by_day (store_id int, barcode bigint, date date, quantity double);
+create table medivh.sales__by_category_by_day (store_id int, category_id int, date date, quantity double);
+create unique index medivh.sales__by_barcode_by_day__key on sales__by_barcode_by_day (store_id, barcode, date);
+create unique index medivh.sales__by_category_by_day__key on sales__by_category_by_day (store_id, category_id, date);
+'''
+# Stores 1 and 3 share the product group where barcode 100 is in category 7 and 101 in category 8
+STORES = [(1, 10), (2, 20), (3, 10)]
+PRODUCTS = [(100, 10, 7), (101, 10, 8), (100, 20, 9)]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # The medivh schema is an attached SQLite database, as the MySQL queries name it
+    schema_path = tmp_path / 'medivh.sqlite'
+    engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path / "main.sqlite"}')
+
+    @event.listens_for(engine, 'connect')
+    def attach(dbapi_con, _):
+        dbapi_con.execute(f"attach database '{schema_path}' as medivh")
+
+    with engine.begin() as con:
+        for statement in filter(str.strip, SCHEMA.split(';')):
+            con.execute(text(statement))
+        con.execute(text('insert into medivh.store values (:id, :group)'),
+                    [{'id': i, 'group': group} for i, group in STORES])
+        con.execute(text('insert into medivh.product values (:barcode, :group, :category)'),
+                    [{'barcode': b, 'group': group, 'category': category} for b, group, category in PRODUCTS])
+    return engine
+
+
+def add_sales(engine, rows):
+    with engine.begin() as con:
+        con.execute(text('insert into medivh.sale__product values (:store_id, :barcode, :sale_time, :quantity)'),
+                    [dict(zip(('store_id', 'barcode', 'sale_time', 'quantity'), row)) for row in rows])
+
+
+def read_table(engine, table):
+    with engine.connect() as con:
+        return [tuple(row) for row in con.execute(text(f'select * from medivh.{table} order by 1, 2, 3'))]
+
+
+def read_watermark(engine):
+    with engine.connect() as con:
+        return read_refresh_watermark(con)
+
+
+def test_incremental_refresh(engine):
+    add_sales(engine, [(1, 100, '2020-01-01 09:00:00', 2.0),
+                       (1, 100, '2020-01-01 18:30:00', 1.5),
+                       (2, 100, '2020-01-01 10:00:00', 4.0),
+                       (1, 101, '2020-01-02 11:00:00', 3.0)])
+    result = refresh_daily_sales(engine)
+    assert result['since'] is None and result['until'] == '2020-01-02 11:00:00'
+    assert result['rows'] == {'sales__by_barcode_by_day': 3, 'sales__by_category_by_day': 3}
+    assert read_watermark(engine) == '2020-01-02 11:00:00'
+
+    # Only the days from the one of the watermark on are aggregated, older days keep their sums
+    add_sales(engine, [(1, 100, '2020-01-03 08:00:00', 5.0),
+                       (3, 100, '2020-01-03 12:00:00', 1.0)])
+    result = refresh_daily_sales(engine, overlap_days=0)
+    assert result['since'] == '2020-01-02 00:00:00' and result['until'] == '2020-01-03 12:00:00'
+    assert result['rows'] == {'sales__by_barcode_by_day': 3, 'sales__by_category_by_day': 3}
+    barcode_sales = [(1, 100, '2020-01-01', 3.5),
+                     (1, 100, '2020-01-03', 5.0),
+                     (1, 101, '2020-01-02', 3.0),
+                     (2, 100, '2020-01-01', 4.0),
+                     (3, 100, '2020-01-03', 1.0)]
+    category_sales = [(1, 7, '2020-01-01', 3.5),
+                      (1, 7, '2020-01-03', 5.0),
+                      (1, 8, '2020-01-02', 3.0),
+                      (2, 9, '2020-01-01', 4.0),
+                      (3, 7, '2020-01-03', 1.0)]
+    assert read_table(engine, 'sales__by_barcode_by_day') == barcode_sales
+    assert read_table(engine, 'sales__by_category_by_day') == category_sales
+    assert read_watermark(engine) == '2020-01-03 12:00:00'
+
+    # Aggregating the same days again leaves the tables and the watermark as they are
+    refresh_daily_sales(engine)
+    assert read_table(engine, 'sales__by_barcode_by_day') == barcode_sales
+    assert read_table(engine, 'sales__by_category_by_day') == category_sales
+    assert read_watermark(engine) == '2020-01-03 12:00:00'
+
+
+def test_intra_day_refresh(engine):
+    # A refresh in the middle of a day is replaced by the sums of the whole day
+    add_sales(engine, [(1, 100, '2020-01-05 09:00:00', 1.0), (1, 101, '2020-01-05 09:30:00', 2.0)])
+    refresh_daily_sales(engine)
+    add_sales(engine, [(1, 100, '2020-01-05 13:00:00', 0.25), (1, 100, '2020-01-05 20:00:00', 3.0)])
+    result = refresh_daily_sales(engine)
+    assert result['rows'] == {'sales__by_barcode_by_day': 2, 'sales__by_category_by_day': 2}
+    assert read_table(engine, 'sales__by_barcode_by_day') == [(1, 100, '2020-01-05', 4.25),
+                                                             (1, 101, '2020-01-05', 2.0)]
+    assert read_table(engine, 'sales__by_category_by_day') == [(1, 7, '2020-01-05', 4.25),
+                                                              (1, 8, '2020-01-05', 2.0)]
+    assert read_watermark(engine) == '2020-01-05 20:00:00'
+
+
+def test_late_rows_refresh(engine):
+    add_sales(engine, [(1, 100, '2020-01-05 09:00:00', 1.0)])
+    refresh_daily_sales(engine)
+    # Rows older than the watermark arrive after the refresh: one of its day, one backdated by a day
+    add_sales(engine, [(1, 101, '2020-01-05 08:00:00', 2.0), (1, 100, '2020-01-04 23:00:00', 0.5)])
+
+    refresh_daily_sales(engine, overlap_days=0)
+    assert read_table(engine, 'sales__by_barcode_by_day') == [(1, 100, '2020-01-05', 1.0),
+                                                             (1, 101, '2020-01-05', 2.0)]
+    refresh_daily_sales(engine, overlap_days=1)
+    assert read_table(engine, 'sales__by_barcode_by_day') == [(1, 100, '2020-01-04', 0.5),
+                                                             (1, 100, '2020-01-05', 1.0),
+                                                             (1, 101, '2020-01-05', 2.0)]
+    assert read_table(engine, 'sales__by_category_by_day') == [(1, 7, '2020-01-04', 0.5),
+                                                              (1, 7, '2020-01-05', 1.0),
+                                                              (1, 8, '2020-01-05', 2.0)]
+    assert read_watermark(engine) == '2020-01-05 09:00:00'
+
+
+def test_rebuild_refresh(engine):
+    add_sales(engine, [(1, 100, '2020-01-01 09:00:00', 2.0), (2, 100, '2020-01-02 09:00:00', 1.0)])
+    refresh_daily_sales(engine)
+    with engine.begin() as con:
+        con.execute(text('update medivh.sales__by_barcode_by_day set quantity = 0'))
+        con.execute(text("insert into medivh.sales__by_category_by_day values (3, 7, '2019-12-31', 9.0)"))
+    add_sales(engine, [(1, 100, '2020-01-02 10:00:00', 1.0)])
+
+    # A rebuild empties the tables and aggregates every row again
+    result = refresh_daily_sales(engine, rebuild=True)
+    assert result['since'] is None and result['until'] == '2020-01-02 10:00:00'
+    assert read_table(engine, 'sales__by_barcode_by_day') == [(1, 100, '2020-01-01', 2.0),
+                                                             (1, 100, '2020-01-02', 1.0),
+                                                             (2, 100, '2020-01-02', 1.0)]
+    assert read_table(engine, 'sales__by_category_by_day') == [(1, 7, '2020-01-01', 2.0),
+                                                              (1, 7, '2020-01-02', 1.0),
+                                                              (2, 9, '2020-01-02', 1.0)]
+    assert read_watermark(engine) == '2020-01-02 10:00:00'
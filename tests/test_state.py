@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from pkg.data.store import create_sales_store
+from pkg.data.synthetic import generate_daily_sales, get_synthetic_barcodes
+from pkg.forecast.kernel import get_forecasts
+from pkg.forecast.state import advance_forecast_state, create_forecast_state, get_state_forecasts
+from pkg.utils.days import to_day_ordinal
+from pkg.utils.sales import get_sales_window
+
+END_DAY = to_day_ordinal(np.datetime64('2020-03-01'))
+HORIZONS = [1, 3, 7, 30]
+
+
+@pytest.fixture(scope='module')
+def sales():
+    return create_sales_store(generate_daily_sales([1], get_synthetic_barcodes(300), END_DAY, 2, seed=7))
+
+
+def get_history_forecasts(algorithm, sales, day):
+    # Forecasts of the full histories cut at `day`, the way a run on the database of that day makes them
+    keys = sorted(sales)
+    history = [sales[key]._replace(values=sales[key].values[:max(day - sales[key].first_day + 1, 0)])
+               if not sales[key].empty and sales[key].first_day <= day else sales[key]._replace(values=np.empty(0))
+               for key in keys]
+    series = np.repeat(np.arange(len(keys)), len(HORIZONS))
+    return get_forecasts(algorithm, history, series, np.full(len(series), day),
+                         np.tile(HORIZONS, len(keys)), last_day_levels=True).reshape(len(keys), -1)
+
+
+@pytest.mark.parametrize('algorithm', ['default', 'mean'])
+def test_state_forecasts_match_full_history(sales, algorithm):
+    state = create_forecast_state(sales, END_DAY)
+    assert np.array_equal(get_state_forecasts(algorithm, state, HORIZONS),
+                          get_history_forecasts(algorithm, sales, END_DAY))
+
+
+def test_next_day_forecasts_are_not_zero(sales):
+    # Forecasts from the last sales day have no sales after the origin to compare the levels with
+    state = create_forecast_state(sales, END_DAY)
+    selling = np.array([not sales[key].empty and sales[key].last_day == END_DAY for key in map(tuple, state.keys)])
+    forecasts = get_state_forecasts('default', state, HORIZONS)[selling]
+    assert selling.sum() > 100
+    assert (forecasts != 0.0).mean() > 0.9
+    assert (forecasts > 0.0).mean() > 0.9
+
+
+def get_sales_rows(state, sales, beg, end):
+    # Sales rows of the days beg..end, as update_state reads them
+    rows, days, quantity = [], [], []
+    for i, key in enumerate(map(tuple, state.keys)):
+        values = get_sales_window(sales[key], beg, end)
+        sold = np.flatnonzero(values)
+        rows += [i] * len(sold)
+        days += (beg + sold).tolist()
+        quantity += values[sold].tolist()
+    return np.array(rows), np.array(days), np.array(quantity)
+
+
+@pytest.mark.parametrize('day', [END_DAY - 20, END_DAY])
+def test_advanced_state_matches_new_state(sales, day):
+    history = {key: series._replace(values=series.values[:max(day - series.first_day + 1, 0)])
+               for key, series in sales.items()}
+    state = create_forecast_state(history, day)
+    # The state was made while the state day was selling, the update reads the whole day again
+    state.values[:, -1] /= 2
+
+    advanced = advance_forecast_state(state, *get_sales_rows(state, sales, day, END_DAY), END_DAY)
+
+    expected = create_forecast_state(sales, END_DAY)
+    assert np.array_equal(advanced.values, expected.values)
+    assert np.array_equal(advanced.last_days, expected.last_days)
+    assert np.array_equal(get_state_forecasts('default', advanced, HORIZONS),
+                          get_state_forecasts('default', expected, HORIZONS))